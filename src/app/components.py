@@ -12,10 +12,13 @@ from litellm.exceptions import RateLimitError
 
 from src.db.db_youtube import YouTubeManager
 from src.llm.llm import LLM
+from src.llm.embeddings import embedding_throughput
+from src.llm.json_stream import JSONArrayStream
 from src.search_engine.search_engine import SearchEngine
+from src.search_engine.metrics import RecentSearchesSink
+from src.search_engine.semantic_cache import SemanticCache
 from src.pipeline.pipeline import Pipeline
 from src.pipeline.pipeline_transcript import Pipeline_Transcript_Faiss
-from src.pipeline.pipeline_chapitres import Pipeline_Chapters_Faiss
 
 
 def load_api_keys():
@@ -40,6 +43,22 @@ def load_api_keys():
         st.session_state["found_api_keys"] = False
 
 
+@st.cache_resource(show_spinner=False)
+def get_search_engine() -> SearchEngine:
+    """
+    Retourne le moteur de recherche partagé par toutes les sessions du serveur.
+
+    Les index FAISS sont chargés une seule fois par processus, puis rechargés
+    explicitement via `SearchEngine.load_indexes` après l'ajout d'une vidéo.
+    Les recherches FAISS lancées en même temps par plusieurs sessions sont regroupées,
+    et les questions reformulées sont servies par le cache sémantique.
+
+    Returns:
+        SearchEngine: Instance partagée du moteur de recherche.
+    """
+    return SearchEngine(batching=True, semantic_cache=SemanticCache())
+
+
 def convert_to_json(response : str) -> dict:
     """
     Fonction pour convertir une réponse en JSON.
@@ -69,6 +88,30 @@ def update_progress(progress_bar: st.progress, message_placeholder: st.empty, st
     progress_bar.progress(int(step / total_steps * 100))
 
 
+def show_stream_preview(preview_placeholder: st.empty, refresh_interval: float = 0.2):
+    """
+    Crée la fonction de suivi d'une génération en streaming, qui affiche le texte
+    généré jusque-là (au plus une fois par intervalle, pour ne pas saturer l'interface).
+
+    Args:
+        preview_placeholder (st.empty): Emplacement de l'aperçu.
+        refresh_interval (float): Intervalle minimal entre deux affichages, en secondes.
+
+    Returns:
+        Callable[[str], None]: Fonction de suivi à passer au pipeline.
+    """
+    last_refresh = 0.0
+
+    def on_progress(text: str):
+        nonlocal last_refresh
+        now = time.monotonic()
+        if now - last_refresh >= refresh_interval:
+            preview_placeholder.caption(text)
+            last_refresh = now
+
+    return on_progress
+
+
 def format_chapter(chapter: tuple) -> str:
     """
     Formate le chapitre en affichant le temps et le titre.
@@ -165,7 +208,7 @@ def generate_research_name(research: str) -> str:
     llm = LLM()
 
     # 5 tentatives pour générer un nom de conversation
-    for _ in range(5):
+    for attempt in range(5):
         try:
             # Génération du nom de la conversation
             research_name = llm.call_model(
@@ -178,6 +221,9 @@ def generate_research_name(research: str) -> str:
                         "content": f"Tu es une intelligence artificielle spécialisée dans la création de nom de thématique en français. En te basant sur le texte suivant, qui est la recherche de l'utilisateur, propose une thématique d'au maximum de 30 caractères. Répond uniquement en donnant la thématique sans explication supplémentaire : {research}",
                     }
                 ],
+                # Les nouvelles tentatives ont besoin d'un nouvel échantillon
+                use_cache=True,
+                bypass_cache=attempt > 0,
             )
 
             # Nettoyage du nom de la conversation
@@ -192,6 +238,7 @@ def generate_research_name(research: str) -> str:
                 st.session_state["selected_research"]
             )
             st.session_state["selected_research"] = research_name
+            break
 
         except RateLimitError:
             time.sleep(5)
@@ -241,11 +288,19 @@ def show_research(current_research: str):
     """
     # Récupération des informations de la recherche
     research = st.session_state["researchs"][current_research]['input']
-    search_engine = SearchEngine()
-    results = search_engine.get_full_search_results(research)
-    st.session_state["researchs"][current_research]["output"] = results
-    db_youtube = YouTubeManager()
-    video_info = db_youtube.get_video_by_id(st.session_state["researchs"][current_research]["output"]["vid_id"], st.session_state["researchs"][current_research]["output"]["chapter_id"])
+    search_engine = get_search_engine()
+
+    # Les résultats ne sont recalculés que si la question ou les index ont changé
+    cache_key = (research, search_engine.version)
+    if st.session_state["researchs"][current_research].get("cache_key") != cache_key:
+        results = search_engine.get_full_search_results(research)
+        db_youtube = YouTubeManager()
+        st.session_state["researchs"][current_research]["output"] = results
+        st.session_state["researchs"][current_research]["video_info"] = (
+            db_youtube.get_video_by_id(results["vid_id"], results["chapter_id"]) if results is not None else None
+        )
+        st.session_state["researchs"][current_research]["cache_key"] = cache_key
+    video_info = st.session_state["researchs"][current_research]["video_info"]
 
     # Informations de la recherche
     for _ in range(4):
@@ -253,6 +308,11 @@ def show_research(current_research: str):
     st.header(f"**{current_research}**")
     st.warning(body=f"**{research}**", icon=":material/search:")
 
+    # Aucune vidéo trouvée (index vide)
+    if video_info is None:
+        st.info("Aucune vidéo ne correspond à votre recherche. Ajoutez des vidéos pour enrichir la base de connaissances.", icon=":material/info:")
+        return
+
     cols = st.columns([7, 3])
     # Affichage de la vidéo YouTube
     with cols[0]:
@@ -292,6 +352,34 @@ def show_research(current_research: str):
     st.write("*SISE Camp peut faire des erreurs. Envisagez de vérifier les informations importantes et n'envoyez pas d'informations confidentielles.*")
 
 
+def show_search_metrics():
+    """
+    Fonction pour afficher le panneau de débogage des latences de la recherche.
+
+    Le panneau n'est affiché que si la destination `debug` est activée
+    (variable d'environnement SEARCH_METRICS_SINKS).
+    """
+    if "debug" not in os.getenv("SEARCH_METRICS_SINKS", ""):
+        return
+
+    metrics = get_search_engine().metrics
+    with st.expander("Latence de la recherche", icon=":material/speed:"):
+        st.table([
+            {"Étape": stage, **{name: (round(value, 1) if isinstance(value, float) else value) for name, value in summary.items()}}
+            for stage, summary in metrics.summary().items()
+        ])
+
+        recent_searches = metrics.get_sink(RecentSearchesSink)
+        if recent_searches is not None and recent_searches.searches:
+            st.write("**Dernière recherche (ms) :**")
+            st.json({stage: round(duration, 1) for stage, duration in recent_searches.searches[-1].items()})
+
+        throughput = embedding_throughput.summary()
+        if throughput["texts"]:
+            st.write("**Débit des embeddings :**")
+            st.json({name: (round(value, 1) if isinstance(value, float) else value) for name, value in throughput.items()})
+
+
 def show_sidebar() -> str:
     """
     Fonction pour afficher la barre latérale de l'application.
@@ -331,6 +419,9 @@ def show_sidebar() -> str:
             if st.button("", icon=":material/info:", use_container_width=True):
                 show_info_dialog()
 
+        # Panneau de débogage des latences
+        show_search_metrics()
+
         # Section des recherches
         st.header("Recherches")
 
@@ -424,10 +515,12 @@ def generate_quiz(chunk: str):
             st.session_state["quiz_total"] = 0
             st.session_state["quiz_results"] = []
 
-            # Génération des questions du quiz
+            # Génération des questions du quiz, affichées dès qu'elles sont complètes
             with st.spinner("Création du quiz..."):
                 llm = LLM()
-                response = llm.call_model(
+                preview_placeholder = st.empty()
+                quiz_stream = JSONArrayStream()
+                stream = llm.call_model_stream(
                     provider="mistral",
                     model="mistral-large-latest",
                     temperature=0.7,
@@ -437,14 +530,32 @@ def generate_quiz(chunk: str):
                             "content": f"Tu es une intelligence artificielle spécialisée dans la création de quiz les vidéos des enseignements en data science. Génère un quiz à choix multiples contenant {nb_questions} questions sur le sujet donné. Retourne les questions sous forme d'un unique tableau JSON. Chaque question doit être un dictionnaire avec les clés suivantes : 'question' (texte de la question), 'options' (liste de 4 options), 'answer' (réponse correcte). Répond en envoyant uniquement et strictement le tableau JSON sans texte supplémentaire. Les questions doivent être exclusivement et uniquement sur les sujets évoqués dans cet extrait de vidéo : {chunk}"
                         }
                     ],
+                    # Après un quiz invalide, la réponse en cache est ignorée
+                    use_cache=True,
+                    bypass_cache=st.session_state.get("quiz_failed", False),
                 )
-
-                # Conversion des données du quiz
+                for content in stream:
+                    if quiz_stream.feed(content):
+                        preview_placeholder.markdown("\n".join(
+                            f"{idx + 1}. {question_data.get('question', '')}"
+                            for idx, question_data in enumerate(quiz_stream.items)
+                        ))
+                preview_placeholder.empty()
+
+                # Conversion des données du quiz (les questions déjà décodées sont
+                # conservées si la réponse complète n'est pas un JSON valide)
                 try:
-                    st.session_state["quiz_data"] = convert_to_json(response)
+                    try:
+                        st.session_state["quiz_data"] = convert_to_json(quiz_stream.buffer)
+                    except json.JSONDecodeError:
+                        if not quiz_stream.items:
+                            raise
+                        st.session_state["quiz_data"] = quiz_stream.items
                     st.session_state["quiz_answers"] = {}
                     st.session_state["quiz_submitted"] = False
+                    st.session_state["quiz_failed"] = False
                 except json.JSONDecodeError:
+                    st.session_state["quiz_failed"] = True
                     st.error(
                         "Une erreur est survenue lors de la création du quiz. "
                         "Veuillez réessayer."
@@ -580,7 +691,6 @@ def show_add_video_dialog():
 
         # Initialisation des pipelines du moteur de recherche
         pipeline_transcript = Pipeline_Transcript_Faiss()
-        pipeline_chapters = Pipeline_Chapters_Faiss()
 
         if not videos:
             st.info("Toutes les vidéos ont déjà été ajoutées", icon=":material/info:")
@@ -627,18 +737,26 @@ def show_add_video_dialog():
                 update_progress(progress_bar, message_placeholder, 5, total_steps, "Transcription de l'audio...")
                 transcription = pipeline.transcribe_audio(chunks)
 
+                # Aperçu des textes générés en streaming
+                preview_placeholder = st.empty()
+
                 update_progress(progress_bar, message_placeholder, 6, total_steps, "Amélioration de la transcription...")
-                transcription = pipeline.transcription_enhancement(transcription)
+                transcription = pipeline.transcription_enhancement(
+                    transcription, on_progress=show_stream_preview(preview_placeholder)
+                )
 
                 update_progress(progress_bar, message_placeholder, 7, total_steps, "Création du résumé...")
-                summary = pipeline.create_summary(transcription)
+                summary = pipeline.create_summary(
+                    transcription, on_progress=show_stream_preview(preview_placeholder)
+                )
+                preview_placeholder.empty()
 
                 update_progress(progress_bar, message_placeholder, 8, total_steps, "Enregistrement des informations...")
                 pipeline.update_video_info(transcription, summary)
 
                 update_progress(progress_bar, message_placeholder, 9, total_steps, "Indexation dans le moteur de recherche...")
                 pipeline_transcript.run_pipeline(video_id)
-                pipeline_chapters.run_pipeline(video_id)
+                get_search_engine().load_indexes()
 
                 update_progress(progress_bar, message_placeholder, 10, total_steps, "Finalisation...")
                 db_youtube.mark_video_as_processed(youtube_url)
@@ -0,0 +1,233 @@
+"""
+Ce fichier contient l'évaluation de la qualité de la recherche (rappel@k, MRR, nDCG@k)
+mise en regard de sa latence.
+
+Le fichier de requêtes annotées est au format JSONL, une requête par ligne :
+    {"query": "comment fonctionne l'ACP ?", "relevant": [{"video_id": 3, "chunk_id": 30012}, {"video_id": 7}]}
+
+Un résultat attendu sans `chunk_id` est satisfait par n'importe quel chunk de la vidéo.
+
+Les embeddings de toutes les requêtes sont calculés avant les mesures : toutes les
+configurations sont chronométrées avec le cache des embeddings chaud. Les types d'index
+qui ne peuvent pas être entraînés sur l'index source sont signalés comme ignorés.
+
+Utilisation :
+    python -m src.benchmark.evaluate --queries-file eval.jsonl --index-types source ivf_pq --modes dense hybrid --nprobe 4 16 64
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from src.benchmark.search_benchmark import StubEmbedder, summarize_latencies
+from src.search_engine.index_factory import (
+    INDEX_TYPES,
+    can_train,
+    get_training_minimum,
+    load_index,
+    rebuild_index,
+    save_index,
+    set_search_parameters,
+)
+from src.search_engine.metrics import MetricsRecorder
+from src.search_engine.search_engine import SearchEngine, SEARCH_MODES, TRANSCRIPTS_INDEX_PATH, DB_PATH
+
+
+def load_labeled_queries(path: str) -> list[dict]:
+    """
+    Charge les requêtes annotées.
+
+    Args:
+        path (str): Chemin du fichier JSONL.
+
+    Returns:
+        list[dict]: Requêtes (`query`) et résultats attendus (`relevant`, couples vidéo / chunk).
+    """
+    labeled_queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not item.get("query") or not item.get("relevant"):
+                raise ValueError(f"Ligne {line_number} : `query` et `relevant` sont obligatoires")
+            labeled_queries.append({
+                "query": item["query"],
+                "relevant": [(int(expected["video_id"]), expected.get("chunk_id")) for expected in item["relevant"]],
+            })
+    return labeled_queries
+
+
+def get_matches(hits: list[dict], relevant: list[tuple]) -> list[bool]:
+    """
+    Indique, pour chaque résultat, s'il satisfait un résultat attendu non encore trouvé.
+
+    Args:
+        hits (list[dict]): Résultats de la recherche, dans l'ordre.
+        relevant (list[tuple]): Couples (vidéo, chunk ou None) attendus.
+
+    Returns:
+        list[bool]: Pertinence de chaque résultat.
+    """
+    remaining = list(relevant)
+    matches = []
+    for hit in hits:
+        match = next(
+            (expected for expected in remaining
+             if expected[0] == hit["vid_id"] and expected[1] in (None, hit["chunk_id"])),
+            None,
+        )
+        if match is not None:
+            remaining.remove(match)
+        matches.append(match is not None)
+    return matches
+
+
+def score_query(matches: list[bool], n_relevant: int, k: int) -> dict:
+    """
+    Calcule les métriques de qualité d'une requête.
+
+    Args:
+        matches (list[bool]): Pertinence de chaque résultat (voir `get_matches`).
+        n_relevant (int): Nombre de résultats attendus.
+        k (int): Nombre de résultats évalués.
+
+    Returns:
+        dict: Rappel@k, rang réciproque et nDCG@k.
+    """
+    matches = matches[:k]
+    first_match = next((rank for rank, match in enumerate(matches, start=1) if match), None)
+    dcg = sum(1 / np.log2(rank + 1) for rank, match in enumerate(matches, start=1) if match)
+    ideal_dcg = sum(1 / np.log2(rank + 1) for rank in range(1, min(n_relevant, k) + 1))
+    return {
+        "recall": sum(matches) / n_relevant,
+        "reciprocal_rank": 1 / first_match if first_match else 0.0,
+        "ndcg": dcg / ideal_dcg,
+    }
+
+
+def evaluate(engine: SearchEngine, labeled_queries: list[dict], k: int = 5, mode: str = "hybrid") -> dict:
+    """
+    Évalue la qualité et la latence d'un moteur de recherche sur des requêtes annotées.
+
+    Args:
+        engine (SearchEngine): Moteur de recherche configuré.
+        labeled_queries (list[dict]): Requêtes annotées (voir `load_labeled_queries`).
+        k (int): Nombre de résultats évalués.
+        mode (str): Mode de recherche.
+
+    Returns:
+        dict: Rappel@k, MRR et nDCG@k moyens, percentiles de latence et latence par étape.
+    """
+    engine.metrics = MetricsRecorder([])
+    scores = []
+    latencies = []
+    for labeled_query in labeled_queries:
+        start = time.perf_counter()
+        hits = engine.search(labeled_query["query"], k, mode)
+        latencies.append(time.perf_counter() - start)
+
+        matches = get_matches(hits, labeled_query["relevant"])
+        scores.append(score_query(matches, len(labeled_query["relevant"]), k))
+
+    return {
+        f"recall@{k}": float(np.mean([score["recall"] for score in scores])),
+        "mrr": float(np.mean([score["reciprocal_rank"] for score in scores])),
+        f"ndcg@{k}": float(np.mean([score["ndcg"] for score in scores])),
+        **summarize_latencies(latencies),
+        "stages": engine.metrics.summary(),
+    }
+
+
+def warm_up_embeddings(engine: SearchEngine, labeled_queries: list[dict]):
+    """
+    Calcule les embeddings de toutes les requêtes (mis en cache) avant les mesures, pour
+    que la première configuration évaluée ne soit pas la seule à payer l'appel au modèle.
+
+    Args:
+        engine (SearchEngine): Moteur de recherche configuré.
+        labeled_queries (list[dict]): Requêtes annotées (voir `load_labeled_queries`).
+    """
+    engine.llm.generate_prompts_embeddings([labeled_query["query"] for labeled_query in labeled_queries])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation de la qualité et de la latence de la recherche.")
+    parser.add_argument("--queries-file", required=True, help="Requêtes annotées (JSONL)")
+    parser.add_argument("--index", default=TRANSCRIPTS_INDEX_PATH, help="Index source")
+    parser.add_argument("--db", default=DB_PATH, help="Base de données")
+    parser.add_argument("--index-types", nargs="+", default=["source"], choices=("source",) + INDEX_TYPES,
+                        help="Types d'index évalués (`source` : index tel quel, sinon reconstruit)")
+    parser.add_argument("--modes", nargs="+", default=["dense", "hybrid"], choices=SEARCH_MODES)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[None], help="Listes visitées (index IVF)")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[None], help="Largeur de recherche (index HNSW)")
+    parser.add_argument("--k", type=int, default=5, help="Nombre de résultats évalués")
+    parser.add_argument("--stub-embedder", action="store_true", help="Utilise un embedder local déterministe (hors ligne)")
+    parser.add_argument("--output", default=None, help="Fichier JSON des résultats (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    labeled_queries = load_labeled_queries(args.queries_file)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index_type in args.index_types:
+            index_path = args.index
+            if index_type != "source":
+                source_index = load_index(args.index, mmap=False)
+                index_path = os.path.join(tmp_dir, f"index_{index_type}.bin")
+                reason = None
+                if not can_train(index_type, source_index.ntotal):
+                    reason = f"au moins {get_training_minimum(index_type)} vecteurs nécessaires ({source_index.ntotal} disponibles)"
+                else:
+                    try:
+                        save_index(rebuild_index(source_index, index_type), index_path)
+                    except (RuntimeError, ValueError) as error:
+                        reason = f"construction impossible : {error}"
+                if reason is not None:
+                    results.append({"index_type": index_type, "skipped": reason})
+                    print(f"{index_type} ignoré : {reason}", file=sys.stderr)
+                    continue
+
+            engine = SearchEngine(index_path, args.db, metrics=MetricsRecorder([]))
+            if args.stub_embedder:
+                StubEmbedder().install(engine)
+            warm_up_embeddings(engine, labeled_queries)
+
+            default_settings = dict(engine.index_settings)
+            for nprobe in args.nprobe:
+                for ef_search in args.ef_search:
+                    engine.index_settings["nprobe"] = nprobe or default_settings["nprobe"]
+                    engine.index_settings["ef_search"] = ef_search or default_settings["ef_search"]
+                    set_search_parameters(
+                        engine.index_transcriptions, engine.index_settings["nprobe"], engine.index_settings["ef_search"]
+                    )
+
+                    for mode in args.modes:
+                        result = evaluate(engine, labeled_queries, args.k, mode)
+                        results.append({
+                            "index_type": index_type,
+                            "mode": mode,
+                            "nprobe": engine.index_settings["nprobe"],
+                            "ef_search": engine.index_settings["ef_search"],
+                            **result,
+                        })
+                        print(
+                            f"{index_type}, {mode}, nprobe={engine.index_settings['nprobe']}, ef_search={engine.index_settings['ef_search']} : "
+                            f"rappel@{args.k} {result[f'recall@{args.k}']:.3f}, MRR {result['mrr']:.3f}, "
+                            f"nDCG@{args.k} {result[f'ndcg@{args.k}']:.3f}, p95 {result['p95_ms']:.2f} ms",
+                            file=sys.stderr,
+                        )
+
+    output = json.dumps({"k": args.k, "queries": len(labeled_queries), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Ce fichier contient le banc d'essai hors ligne du moteur de recherche.
+
+Il construit un corpus synthétique (index FAISS et base SQLite) et mesure le débit et
+les percentiles de latence de `SearchEngine` de bout en bout, avec un embedder local
+déterministe : aucun appel réseau n'est effectué.
+
+Utilisation :
+    python -m src.benchmark.search_benchmark --sizes 10000 100000 --index-types flat ivf_flat --output benchmark.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from src.db.db_youtube import YouTubeManager
+from src.search_engine.faiss_ids import encode_ids
+from src.search_engine.index_factory import INDEX_TYPES, create_index, get_index_settings, save_index
+from src.search_engine.metrics import MetricsRecorder
+from src.search_engine.search_engine import SearchEngine, SEARCH_MODES
+
+EMBEDDING_DIM = 1024  # Dimension des embeddings de mistral-embed
+CHUNKS_PER_VIDEO = 200
+CHAPTERS_PER_VIDEO = 5
+CHUNK_SECONDS = 36  # Durée couverte par un chunk synthétique
+WORDS_PER_CHUNK = 24
+WORDS_PER_QUERY = 6  # Au-delà de KEYWORD_QUERY_MAX_TERMS : les requêtes hybrides sont encodées
+VOCABULARY_SIZE = 5000
+TAGS = ("python", "statistiques", "machine learning", "sql", "visualisation", "deep learning")
+BLOCK_VIDEOS = 50  # Nombre de vidéos générées à la fois
+MAX_TRAINING_VECTORS = 200_000
+
+
+class StubEmbedder:
+    """
+    Embedder local et déterministe remplaçant l'API d'embedding pendant les mesures.
+
+    Le vecteur d'un texte est tiré d'une loi normale initialisée par son empreinte,
+    puis normalisé (comme ceux de mistral-embed).
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        """
+        Initialise l'embedder.
+
+        Args:
+            dim (int): Dimension des vecteurs.
+        """
+        self.dim = dim
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Retourne l'embedding de chaque texte.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+        embeddings = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            embeddings.append((vector / np.linalg.norm(vector)).tolist())
+        return embeddings
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Version asynchrone de `embed`.
+        """
+        return self.embed(texts)
+
+    def install(self, engine: SearchEngine):
+        """
+        Remplace les appels d'embedding du moteur de recherche par l'embedder local.
+
+        Args:
+            engine (SearchEngine): Moteur de recherche à modifier.
+        """
+        engine.llm.generate_prompts_embeddings = self.embed
+        engine.llm.agenerate_prompts_embeddings = self.aembed
+
+
+def generate_words(rng: np.random.Generator, n_words: int) -> str:
+    """
+    Génère un texte synthétique dont la fréquence des mots suit une loi de Zipf.
+
+    Args:
+        rng (np.random.Generator): Générateur aléatoire.
+        n_words (int): Nombre de mots.
+
+    Returns:
+        str: Texte généré.
+    """
+    ranks = np.minimum(rng.zipf(1.3, size=n_words), VOCABULARY_SIZE)
+    return " ".join(f"terme{rank}" for rank in ranks)
+
+
+def generate_block_vectors(seed: int, block: int, n_videos: int, dim: int) -> np.ndarray:
+    """
+    Génère les vecteurs des chunks d'un bloc de vidéos : chaque vidéo forme un groupe
+    de vecteurs proches d'un centre commun.
+
+    Args:
+        seed (int): Graine du corpus.
+        block (int): Numéro du bloc (les blocs sont générés de façon reproductible).
+        n_videos (int): Nombre de vidéos du bloc.
+        dim (int): Dimension des vecteurs.
+
+    Returns:
+        np.ndarray: Vecteurs normalisés, `CHUNKS_PER_VIDEO` par vidéo.
+    """
+    rng = np.random.default_rng([seed, block])
+    centers = rng.standard_normal((n_videos, dim), dtype=np.float32)
+    vectors = np.repeat(centers, CHUNKS_PER_VIDEO, axis=0)
+    vectors += rng.standard_normal(vectors.shape, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def seconds_to_timestamp(seconds: int) -> str:
+    """
+    Convertit une durée en timestamp de chapitre (MM:SS ou H:MM:SS).
+
+    Args:
+        seconds (int): Durée en secondes.
+
+    Returns:
+        str: Timestamp.
+    """
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def build_synthetic_db(db_path: str, n_videos: int, seed: int = 0):
+    """
+    Crée une base synthétique (vidéos, tags, chapitres, chunks) avec le schéma de l'application.
+
+    Args:
+        db_path (str): Chemin de la base à créer.
+        n_videos (int): Nombre de vidéos.
+        seed (int): Graine du corpus.
+    """
+    YouTubeManager(db_path)  # Crée le schéma complet (index plein texte compris)
+    rng = np.random.default_rng(seed)
+    duration = CHUNKS_PER_VIDEO * CHUNK_SECONDS
+    chapter_seconds = duration // CHAPTERS_PER_VIDEO
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for video_id in range(1, n_videos + 1):
+        youtube_id = f"synth{video_id:06d}"
+        cursor.execute(
+            "INSERT INTO videos (id, url, title, upload_date, description, duration, transcription, resume, youtube_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                video_id, f"https://www.youtube.com/watch?v={youtube_id}", f"Vidéo synthétique {video_id}",
+                f"20{20 + video_id % 5}{1 + video_id % 12:02d}{1 + video_id % 28:02d}", generate_words(rng, 40),
+                duration, "", "", youtube_id,
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO tags (video_id, tag_name) VALUES (?, ?)",
+            [(video_id, tag) for tag in rng.choice(TAGS, size=2, replace=False)],
+        )
+        cursor.executemany(
+            "INSERT INTO video_chapters (video_id, timestamp, subtitle, start_seconds, end_seconds) VALUES (?, ?, ?, ?, ?)",
+            [
+                (video_id, seconds_to_timestamp(start), f"Chapitre {position + 1}", start, start + chapter_seconds)
+                for position, start in enumerate(range(0, duration, chapter_seconds))
+            ],
+        )
+        chunk_ids = encode_ids(np.full(CHUNKS_PER_VIDEO, video_id), np.arange(1, CHUNKS_PER_VIDEO + 1))
+        cursor.executemany(
+            "INSERT INTO chunks (id, video_id, chunks, start_seconds, end_seconds) VALUES (?, ?, ?, ?, ?)",
+            [
+                (int(chunk_id), video_id, generate_words(rng, WORDS_PER_CHUNK), position * CHUNK_SECONDS, (position + 1) * CHUNK_SECONDS)
+                for position, chunk_id in enumerate(chunk_ids)
+            ],
+        )
+    conn.commit()
+    conn.close()
+
+
+def build_synthetic_index(index_path: str, index_type: str, n_videos: int, seed: int = 0, dim: int = EMBEDDING_DIM):
+    """
+    Construit et enregistre l'index FAISS des chunks de la base synthétique.
+
+    Args:
+        index_path (str): Chemin de l'index à créer.
+        index_type (str): Type d'index (voir INDEX_TYPES).
+        n_videos (int): Nombre de vidéos.
+        seed (int): Graine du corpus (identique à celle de la base).
+        dim (int): Dimension des vecteurs.
+    """
+    blocks = [(block, min(BLOCK_VIDEOS, n_videos - start)) for block, start in enumerate(range(0, n_videos, BLOCK_VIDEOS))]
+    index = create_index(index_type, dim, n_videos * CHUNKS_PER_VIDEO)
+
+    if not index.is_trained:
+        training = []
+        for block, block_videos in blocks:
+            if sum(len(vectors) for vectors in training) >= MAX_TRAINING_VECTORS:
+                break
+            training.append(generate_block_vectors(seed, block, block_videos, dim))
+        index.train(np.concatenate(training)[:MAX_TRAINING_VECTORS])
+
+    for block, block_videos in blocks:
+        first_video = block * BLOCK_VIDEOS + 1
+        video_ids = np.repeat(np.arange(first_video, first_video + block_videos), CHUNKS_PER_VIDEO)
+        local_ids = np.tile(np.arange(1, CHUNKS_PER_VIDEO + 1), block_videos)
+        index.add_with_ids(generate_block_vectors(seed, block, block_videos, dim), encode_ids(video_ids, local_ids))
+
+    save_index(index, index_path)
+
+
+def prepare_corpus(work_dir: str, n_vectors: int, index_type: str, seed: int = 0) -> tuple[str, str]:
+    """
+    Retourne la base et l'index synthétiques demandés, en les construisant s'ils n'existent pas encore.
+
+    Args:
+        work_dir (str): Dossier des corpus synthétiques.
+        n_vectors (int): Nombre de vecteurs souhaité (arrondi au nombre de chunks par vidéo).
+        index_type (str): Type d'index.
+        seed (int): Graine du corpus.
+
+    Returns:
+        tuple[str, str]: Chemins de l'index et de la base.
+    """
+    n_videos = max(1, n_vectors // CHUNKS_PER_VIDEO)
+    corpus_dir = os.path.join(work_dir, f"corpus_{n_videos * CHUNKS_PER_VIDEO}_{seed}")
+    os.makedirs(corpus_dir, exist_ok=True)
+
+    db_path = os.path.join(corpus_dir, "videos.db")
+    if not os.path.exists(db_path):
+        tmp_path = f"{db_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        build_synthetic_db(tmp_path, n_videos, seed)
+        os.replace(tmp_path, db_path)
+
+    index_path = os.path.join(corpus_dir, f"index_{index_type}.bin")
+    if not os.path.exists(index_path):
+        build_synthetic_index(index_path, index_type, n_videos, seed)
+
+    return index_path, db_path
+
+
+def generate_queries(n_queries: int, seed: int = 0) -> list[str]:
+    """
+    Génère des requêtes synthétiques à partir du vocabulaire du corpus.
+
+    Args:
+        n_queries (int): Nombre de requêtes.
+        seed (int): Graine des requêtes.
+
+    Returns:
+        list[str]: Requêtes.
+    """
+    rng = np.random.default_rng([seed, 1])
+    return [generate_words(rng, WORDS_PER_QUERY) for _ in range(n_queries)]
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    """
+    Résume des latences mesurées.
+
+    Args:
+        latencies (list[float]): Latences en secondes.
+
+    Returns:
+        dict: Moyenne et percentiles p50 / p95 / p99, en millisecondes.
+    """
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "mean_ms": float(np.mean(latencies) * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def run_benchmark(
+    engine: SearchEngine,
+    queries: list[str],
+    k: int = 5,
+    mode: str = "dense",
+    concurrency: int = 1,
+    use_async: bool = False,
+    warmup: int = 10,
+) -> dict:
+    """
+    Mesure le débit et la latence de bout en bout du moteur de recherche.
+
+    Args:
+        engine (SearchEngine): Moteur de recherche (avec un embedder local).
+        queries (list[str]): Requêtes exécutées.
+        k (int): Nombre de résultats par requête.
+        mode (str): Mode de recherche.
+        concurrency (int): Nombre de recherches simultanées.
+        use_async (bool): Utilise `asearch` depuis une boucle d'événements plutôt que des threads.
+        warmup (int): Nombre de requêtes d'échauffement non mesurées.
+
+    Returns:
+        dict: Débit (requêtes par seconde), percentiles de latence et latence par étape.
+    """
+    for query in queries[:warmup]:
+        engine.search(query, k, mode)
+    engine.metrics = MetricsRecorder([])
+
+    def timed_search(query: str) -> float:
+        start = time.perf_counter()
+        engine.search(query, k, mode)
+        return time.perf_counter() - start
+
+    async def timed_asearch(query: str, semaphore: asyncio.Semaphore) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await engine.asearch(query, k, mode)
+            return time.perf_counter() - start
+
+    async def run_async() -> list[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[timed_asearch(query, semaphore) for query in queries])
+
+    start = time.perf_counter()
+    if use_async:
+        latencies = asyncio.run(run_async())
+    elif concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = list(executor.map(timed_search, queries))
+    else:
+        latencies = [timed_search(query) for query in queries]
+    elapsed = time.perf_counter() - start
+
+    return {
+        "queries": len(queries),
+        "qps": len(queries) / elapsed,
+        **summarize_latencies(latencies),
+        "stages": engine.metrics.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai hors ligne du moteur de recherche.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Tailles des index")
+    parser.add_argument("--index-types", nargs="+", default=["flat"], choices=INDEX_TYPES)
+    parser.add_argument("--modes", nargs="+", default=["dense", "hybrid"], choices=SEARCH_MODES)
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de requêtes mesurées")
+    parser.add_argument("--k", type=int, default=5, help="Nombre de résultats par requête")
+    parser.add_argument("--concurrency", type=int, default=1, help="Nombre de recherches simultanées")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Utilise la recherche asynchrone")
+    parser.add_argument("--batching", action="store_true", help="Regroupe les recherches FAISS concurrentes")
+    parser.add_argument("--nprobe", type=int, default=None, help="Listes visitées (index IVF)")
+    parser.add_argument("--ef-search", type=int, default=None, help="Largeur de recherche (index HNSW)")
+    parser.add_argument("--no-mmap", action="store_true", help="Charge l'index en mémoire plutôt que par mmap")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du corpus et des requêtes")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "sise_camp_benchmark"), help="Dossier des corpus synthétiques")
+    parser.add_argument("--output", default=None, help="Fichier JSON des résultats (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    queries = generate_queries(args.queries, args.seed)
+    index_settings = get_index_settings(nprobe=args.nprobe, ef_search=args.ef_search)
+    embedder = StubEmbedder()
+    results = []
+    for size in args.sizes:
+        for index_type in args.index_types:
+            start = time.perf_counter()
+            index_path, db_path = prepare_corpus(args.work_dir, size, index_type, args.seed)
+            build_seconds = time.perf_counter() - start
+
+            engine = SearchEngine(
+                index_path, db_path, nprobe=args.nprobe, ef_search=args.ef_search, mmap=not args.no_mmap,
+                batching=args.batching, metrics=MetricsRecorder([]),
+            )
+            embedder.install(engine)
+
+            for mode in args.modes:
+                result = run_benchmark(engine, queries, args.k, mode, args.concurrency, args.use_async)
+                results.append({
+                    "n_vectors": engine.index_transcriptions.ntotal,
+                    "index_type": index_type,
+                    "mode": mode,
+                    "build_seconds": build_seconds,
+                    **result,
+                })
+                print(f"{size} vecteurs, {index_type}, {mode} : {result['qps']:.1f} requêtes/s, p99 {result['p99_ms']:.2f} ms", file=sys.stderr)
+
+    report = {
+        "config": {
+            "dim": EMBEDDING_DIM,
+            "k": args.k,
+            "queries": args.queries,
+            "concurrency": args.concurrency,
+            "async": args.use_async,
+            "batching": args.batching,
+            "nprobe": index_settings["nprobe"],
+            "ef_search": index_settings["ef_search"],
+            "mmap": not args.no_mmap,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
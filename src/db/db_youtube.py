@@ -1,9 +1,16 @@
 import yt_dlp
 import sqlite3
+import csv
 import re
 import time
 import os.path
 
+from src.preprocessing.preprocess import TextProcessor
+from src.search_engine.faiss_ids import decode_id
+
+# Timestamp de chapitre (MM:SS ou H:MM:SS) suivi de son titre
+CHAPTER_PATTERN = r'((?:\d{1,2}:)?\d{1,2}:\d{2}) (.+)'
+
 class YouTubeManager:
     """
     Classe pour gérer les vidéos YouTube, extraire leurs informations
@@ -48,6 +55,17 @@ class YouTubeManager:
             cursor.execute("ALTER TABLE videos ADD COLUMN parsed BOOLEAN DEFAULT TRUE")
             conn.commit()
 
+        # Vérifier si la colonne `youtube_id` existe, sinon l'ajouter et la renseigner
+        if "youtube_id" not in columns:
+            cursor.execute("ALTER TABLE videos ADD COLUMN youtube_id TEXT")
+            cursor.execute("SELECT id, url FROM videos")
+            for video_id, url in cursor.fetchall():
+                cursor.execute(
+                    "UPDATE videos SET youtube_id = ? WHERE id = ?",
+                    (self.extract_youtube_id(url), video_id),
+                )
+            conn.commit()
+
         # Création de la table `tags`
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS tags (
@@ -69,9 +87,170 @@ class YouTubeManager:
         )
         ''')
 
+        # Vérifier si la colonne `start_seconds` existe, sinon l'ajouter et la renseigner
+        cursor.execute("PRAGMA table_info(video_chapters)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if "start_seconds" not in columns:
+            cursor.execute("ALTER TABLE video_chapters ADD COLUMN start_seconds INTEGER")
+            cursor.execute("SELECT id, timestamp FROM video_chapters")
+            for chapter_id, timestamp in cursor.fetchall():
+                cursor.execute(
+                    "UPDATE video_chapters SET start_seconds = ? WHERE id = ?",
+                    (self.timestamp_to_seconds(timestamp), chapter_id),
+                )
+
+        # Vérifier si la colonne `end_seconds` existe, sinon l'ajouter et la renseigner
+        if "end_seconds" not in columns:
+            cursor.execute("ALTER TABLE video_chapters ADD COLUMN end_seconds INTEGER")
+            cursor.execute("SELECT DISTINCT video_id FROM video_chapters")
+            for (video_id,) in cursor.fetchall():
+                self.update_chapters_end(cursor, video_id)
+
+        # Création de la table `chunks`
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY,
+            video_id INTEGER,
+            chunks TEXT,
+            start_seconds INTEGER,
+            end_seconds INTEGER,
+            FOREIGN KEY (video_id) REFERENCES videos(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # Vérifier si les colonnes de position temporelle des chunks existent, sinon les ajouter et les renseigner
+        cursor.execute("PRAGMA table_info(chunks)")
+        columns = [col[1] for col in cursor.fetchall()]
+        if "start_seconds" not in columns:
+            cursor.execute("ALTER TABLE chunks ADD COLUMN start_seconds INTEGER")
+            cursor.execute("ALTER TABLE chunks ADD COLUMN end_seconds INTEGER")
+            cursor.execute("SELECT DISTINCT video_id FROM chunks")
+            for (video_id,) in cursor.fetchall():
+                self.update_chunks_spans(cursor, video_id)
+
+        # Création de l'index plein texte (FTS5) des chunks, tenu à jour par des triggers
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='chunks_fts'")
+        if cursor.fetchone() is None:
+            try:
+                cursor.execute('''
+                CREATE VIRTUAL TABLE chunks_fts USING fts5(
+                    chunks, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+                ''')
+                cursor.executescript('''
+                CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+                    INSERT INTO chunks_fts (rowid, chunks) VALUES (new.id, new.chunks);
+                END;
+                CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+                    INSERT INTO chunks_fts (chunks_fts, rowid, chunks) VALUES ('delete', old.id, old.chunks);
+                END;
+                CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF chunks ON chunks BEGIN
+                    INSERT INTO chunks_fts (chunks_fts, rowid, chunks) VALUES ('delete', old.id, old.chunks);
+                    INSERT INTO chunks_fts (rowid, chunks) VALUES (new.id, new.chunks);
+                END;
+                ''')
+                cursor.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+            except sqlite3.OperationalError as e:
+                print(f"Index plein texte indisponible (FTS5) : {e}")
+
         conn.commit()
         conn.close()
-    
+
+    def update_chapters_end(self, cursor, video_id):
+        """
+        Renseigne la fin de chaque chapitre d'une vidéo : début du chapitre suivant,
+        ou durée de la vidéo pour le dernier chapitre.
+
+        Args:
+            cursor (sqlite3.Cursor): Curseur de la connexion en cours
+            video_id (int): Identifiant de la vidéo
+        """
+        cursor.execute("SELECT duration FROM videos WHERE id = ?", (video_id,))
+        result = cursor.fetchone()
+        duration = result[0] if result and result[0] else None
+
+        cursor.execute(
+            "SELECT id, start_seconds FROM video_chapters WHERE video_id = ? ORDER BY start_seconds, id",
+            (video_id,),
+        )
+        chapters = cursor.fetchall()
+        for position, (chapter_id, _) in enumerate(chapters):
+            if position + 1 < len(chapters):
+                end_seconds = chapters[position + 1][1]
+            else:
+                end_seconds = duration
+            cursor.execute(
+                "UPDATE video_chapters SET end_seconds = ? WHERE id = ?",
+                (end_seconds, chapter_id),
+            )
+
+    def update_chunks_spans(self, cursor, video_id):
+        """
+        Renseigne la position temporelle approximative des chunks d'une vidéo.
+
+        La position d'un chunk est estimée à partir de la position de son premier
+        token dans la transcription, rapportée à la durée de la vidéo.
+
+        Args:
+            cursor (sqlite3.Cursor): Curseur de la connexion en cours
+            video_id (int): Identifiant de la vidéo
+        """
+        cursor.execute("SELECT duration FROM videos WHERE id = ?", (video_id,))
+        result = cursor.fetchone()
+        if not result or not result[0]:
+            return
+        duration = result[0]
+
+        cursor.execute("SELECT id, chunks FROM chunks WHERE video_id = ? ORDER BY id", (video_id,))
+        chunks = cursor.fetchall()
+        if not chunks:
+            return
+
+        # Les chunks se suivent avec un pas de (chunk_size - chunk_overlap) tokens
+        processor = TextProcessor()
+        step = processor.chunk_size - processor.chunk_overlap
+        total_tokens = (len(chunks) - 1) * step + len((chunks[-1][1] or "").split())
+
+        for position, (chunk_id, chunk_text) in enumerate(chunks):
+            start_token = position * step
+            end_token = start_token + len((chunk_text or "").split())
+            cursor.execute(
+                "UPDATE chunks SET start_seconds = ?, end_seconds = ? WHERE id = ?",
+                (
+                    start_token * duration // max(total_tokens, 1),
+                    min(end_token * duration // max(total_tokens, 1), duration),
+                    chunk_id,
+                ),
+            )
+
+    def extract_youtube_id(self, url):
+        """
+        Extrait l'identifiant YouTube d'une URL de vidéo.
+
+        Args:
+            url (str): URL de la vidéo YouTube
+
+        Returns:
+            str or None: Identifiant YouTube si trouvé, sinon None
+        """
+        match = re.search(r"(?<=v=)[\w-]+", url or "")
+        return match.group(0) if match else None
+
+    def timestamp_to_seconds(self, timestamp):
+        """
+        Convertit un timestamp de chapitre (MM:SS ou H:MM:SS) en nombre de secondes.
+
+        Args:
+            timestamp (str): Timestamp du chapitre
+
+        Returns:
+            int: Nombre de secondes depuis le début de la vidéo
+        """
+        total_seconds = 0
+        for part in (timestamp or "0").split(':'):
+            total_seconds = total_seconds * 60 + int(part)
+        return total_seconds
+
     def extract_chapters(self, description):
         """
         Extrait les timestamps et sous-titres de la description d'une vidéo.
@@ -82,8 +261,7 @@ class YouTubeManager:
         Returns:
             list: Liste de tuples (timestamp, sous-titre)
         """
-        pattern = r'(\d{2}:\d{2}) (.+)'
-        matches = re.findall(pattern, description)
+        matches = re.findall(CHAPTER_PATTERN, description)
         return matches
     
     def clean_description(self, description):
@@ -101,7 +279,7 @@ class YouTubeManager:
         
         for line in lines:
             # If the line doesn't match the timestamp pattern, keep it
-            if not re.match(r'^\d{2}:\d{2} .+', line.strip()):
+            if not re.match(CHAPTER_PATTERN, line.strip()):
                 cleaned_lines.append(line)
         
         return '\n'.join(cleaned_lines)
@@ -191,10 +369,11 @@ class YouTubeManager:
 
         # Insérer ou mettre à jour la vidéo avec `parsed`
         cursor.execute('''
-        INSERT OR REPLACE INTO videos (url, title, upload_date, description, duration, transcription, resume, parsed)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT OR REPLACE INTO videos (url, youtube_id, title, upload_date, description, duration, transcription, resume, parsed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             video_info['url'],
+            self.extract_youtube_id(video_info['url']),
             video_info['title'],
             video_info['upload_date'],
             video_info['description'],
@@ -218,9 +397,10 @@ class YouTubeManager:
         if 'chapters' in video_info and video_info['chapters']:
             for timestamp, subtitle in video_info['chapters']:
                 cursor.execute('''
-                INSERT INTO video_chapters (video_id, timestamp, subtitle)
-                VALUES (?, ?, ?)
-                ''', (video_id, timestamp, subtitle))
+                INSERT INTO video_chapters (video_id, timestamp, subtitle, start_seconds)
+                VALUES (?, ?, ?, ?)
+                ''', (video_id, timestamp, subtitle, self.timestamp_to_seconds(timestamp)))
+            self.update_chapters_end(cursor, video_id)
 
         conn.commit()
         conn.close()
@@ -518,9 +698,9 @@ class YouTubeManager:
 
             # Ajouter la vidéo avec parsed = FALSE
             cursor.execute('''
-            INSERT INTO videos (url, title, parsed) 
-            VALUES (?, ?, ?)
-            ''', (url, title, False))
+            INSERT INTO videos (url, youtube_id, title, parsed)
+            VALUES (?, ?, ?, ?)
+            ''', (url, self.extract_youtube_id(url), title, False))
 
             print(f"Ajouté à la base : {title}")
 
@@ -588,9 +768,10 @@ class YouTubeManager:
             if 'chapters' in video_info and video_info['chapters']:
                 for timestamp, subtitle in video_info['chapters']:
                     cursor.execute('''
-                    INSERT INTO video_chapters (video_id, timestamp, subtitle)
-                    VALUES (?, ?, ?)
-                    ''', (video_id, timestamp, subtitle))
+                    INSERT INTO video_chapters (video_id, timestamp, subtitle, start_seconds)
+                    VALUES (?, ?, ?, ?)
+                    ''', (video_id, timestamp, subtitle, self.timestamp_to_seconds(timestamp)))
+                self.update_chapters_end(cursor, video_id)
             
             conn.commit()
             conn.close()
@@ -603,8 +784,9 @@ class YouTubeManager:
         
     def create_chunks_table(self, csv_file):
         """
-        Ajoute une table 'chunks' avec trois colonnes (id, video_id, chunks) à la base de données existante.
-        Insère ensuite les données à partir d'un fichier CSV en respectant la conversion des IDs.
+        Ajoute une table 'chunks' (id, video_id, chunks et position temporelle) à la base de données existante.
+        Insère ensuite les données à partir d'un fichier CSV en respectant la conversion des IDs,
+        puis renseigne la position temporelle des chunks importés.
 
         Args:
             csv_file (str): Chemin du fichier CSV.
@@ -623,12 +805,15 @@ class YouTubeManager:
                     id INTEGER PRIMARY KEY,
                     video_id INTEGER,
                     chunks TEXT,
+                    start_seconds INTEGER,
+                    end_seconds INTEGER,
                     FOREIGN KEY (video_id) REFERENCES videos(id) ON DELETE CASCADE
                 )
             ''')
             print("Table 'chunks' créée avec succès.")
 
         # Lire et insérer les données du CSV
+        imported_video_ids = set()
         with open(csv_file, newline='', encoding='utf-8') as file:
             reader = csv.reader(file)
             next(reader)  # Ignorer l'en-tête
@@ -637,13 +822,10 @@ class YouTubeManager:
                 chunk_id = int(row[0])  # Convertir l'ID en entier
                 chunk_text = row[1]  
 
-                # Extraire les 2 premiers chiffres de chunk_id
-                prefix = int(str(chunk_id))
+                # Récupérer l'ID de la vidéo encodé dans chunk_id
+                video_id, _ = decode_id(chunk_id)
 
-                # Mapping des IDs
-                if 10000 <= prefix <= 300000:  
-                    video_id = prefix // 10000
-                else:
+                if video_id < 1:
                     print(f"⚠️ Chunk ignoré: {chunk_id} (ID non reconnu)")
                     continue
 
@@ -654,9 +836,14 @@ class YouTubeManager:
                 if video_exists:
                     cursor.execute('INSERT INTO chunks (id, video_id, chunks) VALUES (?, ?, ?)', 
                                    (chunk_id, video_id, chunk_text))
+                    imported_video_ids.add(video_id)
                 else:
                     print(f"⚠️ Aucune vidéo trouvée pour video_id={video_id}, chunk ignoré: {chunk_id}")
 
+        # Position temporelle des chunks importés
+        for video_id in imported_video_ids:
+            self.update_chunks_spans(cursor, video_id)
+
         conn.commit()
         conn.close()
         print("✅ Données insérées dans la table 'chunks'.")
@@ -0,0 +1,180 @@
+"""
+Ce fichier contient le cache persistant des réponses des modèles de langage.
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+
+COMPLETION_CACHE_PATH = "cache/completions_cache.db"
+DEFAULT_TTL = 7 * 24 * 3600  # Durée de vie d'une réponse, en secondes
+DEFAULT_MAX_ENTRIES = 2000
+
+
+class CompletionCache:
+    """
+    Cache des réponses des modèles de langage stocké dans une base SQLite.
+
+    La clé est le hash du fournisseur, du modèle, de la température et des messages.
+    Les réponses expirent après `ttl` secondes et les entrées les moins récemment
+    utilisées sont supprimées au-delà de `max_entries` (LRU). Comme le cache des
+    embeddings, la base est partagée entre les processus (mode WAL).
+    """
+
+    def __init__(self, db_path: str = COMPLETION_CACHE_PATH, ttl: float | None = None, max_entries: int | None = None):
+        """
+        Initialise le cache des réponses.
+
+        Args:
+            db_path (str): Chemin vers la base SQLite du cache.
+            ttl (float | None): Durée de vie des réponses en secondes (COMPLETION_CACHE_TTL par défaut).
+            max_entries (int | None): Nombre maximal de réponses (COMPLETION_CACHE_MAX_ENTRIES par défaut).
+        """
+        if ttl is None:
+            ttl = float(os.getenv("COMPLETION_CACHE_TTL", DEFAULT_TTL))
+        if max_entries is None:
+            max_entries = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._setup_done = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Ouvre une connexion vers la base du cache et crée la table si nécessaire.
+
+        Returns:
+            sqlite3.Connection: Connexion à la base du cache.
+        """
+        if not self._setup_done:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+
+        if not self._setup_done:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                response TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+            ''')
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions (last_access)"
+            )
+            conn.commit()
+            self._setup_done = True
+
+        return conn
+
+    def make_key(self, provider: str, model: str, temperature: float, prompt_dict: list[dict[str, str]]) -> str:
+        """
+        Calcule la clé d'un appel au modèle.
+
+        Args:
+            provider (str): Nom du fournisseur.
+            model (str): Nom du modèle.
+            temperature (float): Température de l'échantillonnage.
+            prompt_dict (list): Liste des prompts.
+
+        Returns:
+            str: Clé SHA-256 de l'appel.
+        """
+        messages = json.dumps(prompt_dict, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(f"{provider}\0{model}\0{float(temperature)}\0{messages}".encode("utf-8")).hexdigest()
+
+    def get(self, provider: str, model: str, temperature: float, prompt_dict: list[dict[str, str]]) -> str | None:
+        """
+        Récupère la réponse d'un appel identique s'il est présent et non expiré.
+
+        Args:
+            provider (str): Nom du fournisseur.
+            model (str): Nom du modèle.
+            temperature (float): Température de l'échantillonnage.
+            prompt_dict (list): Liste des prompts.
+
+        Returns:
+            str | None: Réponse en cache, sinon None.
+        """
+        key = self.make_key(provider, model, temperature, prompt_dict)
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT response FROM completions WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, provider: str, model: str, temperature: float, prompt_dict: list[dict[str, str]], response: str):
+        """
+        Ajoute une réponse au cache puis supprime les entrées expirées et les plus
+        anciennes si la taille maximale est dépassée.
+
+        Args:
+            provider (str): Nom du fournisseur.
+            model (str): Nom du modèle.
+            temperature (float): Température de l'échantillonnage.
+            prompt_dict (list): Liste des prompts.
+            response (str): Réponse générée.
+        """
+        key = self.make_key(provider, model, temperature, prompt_dict)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+            count = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute('''
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM completions ORDER BY last_access ASC LIMIT ?
+                )
+                ''', (count - self.max_entries,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs du cache pour le processus courant.
+
+        Returns:
+            dict: Nombre de hits, de misses, taux de hit et nombre d'entrées stockées.
+        """
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        finally:
+            conn.close()
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
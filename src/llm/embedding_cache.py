@@ -0,0 +1,246 @@
+"""
+Ce fichier contient le cache persistant des embeddings de requêtes.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from src.preprocessing.preprocess import TextProcessor
+from src.llm.embedding_store import SQLITE_MAX_VARIABLES
+
+EMBEDDING_CACHE_PATH = "cache/embeddings_cache.db"
+ACCESS_FLUSH_INTERVAL = 60  # Secondes entre deux enregistrements des dates d'accès
+EVICTION_TARGET = 0.9  # Fraction de la taille maximale conservée après une éviction
+
+
+class EmbeddingCache:
+    """
+    Cache des embeddings adressé par contenu et stocké dans une base SQLite.
+
+    La clé est le hash du nom du modèle et du texte normalisé. Le nombre d'entrées
+    est borné : les entrées les moins récemment utilisées sont supprimées en
+    premier (LRU), à la date d'accès près (enregistrée en différé). La base étant un simple fichier SQLite en mode WAL, le cache
+    peut être partagé entre plusieurs processus.
+    """
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, max_entries: int = 50000):
+        """
+        Initialise le cache des embeddings.
+
+        Args:
+            db_path (str): Chemin vers la base SQLite du cache.
+            max_entries (int): Nombre maximal d'embeddings conservés.
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.processor = TextProcessor()
+        self.hits = 0
+        self.misses = 0
+        self._setup_done = False
+        self._entries = None
+        self._pending_access = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Ouvre une connexion vers la base du cache et crée la table si nécessaire.
+
+        Returns:
+            sqlite3.Connection: Connexion à la base du cache.
+        """
+        if not self._setup_done:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+
+        if not self._setup_done:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                embedding BLOB,
+                last_access REAL
+            )
+            ''')
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+            )
+            conn.commit()
+            self._setup_done = True
+
+        return conn
+
+    def make_key(self, model: str, text: str) -> str:
+        """
+        Calcule la clé d'un texte pour un modèle donné.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            text (str): Texte à encoder.
+
+        Returns:
+            str: Clé SHA-256 du couple (modèle, texte normalisé).
+        """
+        normalized_text = self.processor.normalize_text(text)
+        return hashlib.sha256(f"{model}\0{normalized_text}".encode("utf-8")).hexdigest()
+
+    def _flush_access(self, conn: sqlite3.Connection, force: bool = False):
+        """
+        Enregistre les dates d'accès des hits en attente, au plus une fois par
+        ACCESS_FLUSH_INTERVAL secondes (sauf `force`). L'appelant valide la transaction.
+
+        Args:
+            conn (sqlite3.Connection): Connexion à la base du cache.
+            force (bool): Enregistre même si l'intervalle n'est pas écoulé.
+        """
+        with self._lock:
+            if not self._pending_access or (not force and time.time() - self._last_flush < ACCESS_FLUSH_INTERVAL):
+                return
+            pending, self._pending_access = self._pending_access, {}
+            self._last_flush = time.time()
+        conn.executemany(
+            "UPDATE embeddings SET last_access = ? WHERE key = ?",
+            [(last_access, key) for key, last_access in pending.items()],
+        )
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """
+        Récupère les embeddings de plusieurs textes présents dans le cache, en une connexion.
+
+        La date d'accès des hits est mise à jour en différé (voir `_flush_access`).
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            texts (list[str]): Textes recherchés.
+
+        Returns:
+            list[list[float] | None]: Embeddings, dans l'ordre des textes (None si absent).
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        rows = {}
+        conn = self._connect()
+        try:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ", ".join("?" for _ in batch)
+                rows.update(conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall())
+
+            now = time.time()
+            with self._lock:
+                self._pending_access.update((key, now) for key in rows)
+            self._flush_access(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+        embeddings = [np.frombuffer(rows[key], dtype=np.float32).tolist() if key in rows else None for key in keys]
+        with self._lock:
+            self.hits += len(texts) - embeddings.count(None)
+            self.misses += embeddings.count(None)
+        return embeddings
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        """
+        Récupère l'embedding d'un texte s'il est présent dans le cache.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            text (str): Texte recherché.
+
+        Returns:
+            list[float] | None: Embedding en cache, sinon None.
+        """
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]]):
+        """
+        Ajoute les embeddings de plusieurs textes en une transaction, puis supprime les
+        entrées les plus anciennes si la taille maximale est dépassée.
+
+        Le nombre d'entrées est suivi au fil des ajouts et recompté uniquement lorsqu'il
+        dépasse la taille maximale : le cache est alors ramené à EVICTION_TARGET de celle-ci.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            texts (list[str]): Textes encodés.
+            embeddings (list[list[float]]): Embeddings, dans l'ordre des textes.
+        """
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), model, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        if not rows:
+            return
+
+        conn = self._connect()
+        try:
+            self._flush_access(conn, force=True)
+            inserted = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, embedding, last_access) VALUES (?, ?, ?, ?)", rows
+            ).rowcount
+            with self._lock:
+                if self._entries is None:
+                    self._entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                else:
+                    self._entries += inserted
+                over_limit = self._entries > self.max_entries
+
+            if over_limit:
+                # Recomptage : la base peut être partagée avec d'autres processus
+                count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                target = int(self.max_entries * EVICTION_TARGET)
+                if count > self.max_entries:
+                    conn.execute('''
+                    DELETE FROM embeddings WHERE key IN (
+                        SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?
+                    )
+                    ''', (count - target,))
+                    count = target
+                with self._lock:
+                    self._entries = count
+            conn.commit()
+        finally:
+            conn.close()
+
+    def put(self, model: str, text: str, embedding: list[float]):
+        """
+        Ajoute un embedding au cache (voir `put_many`).
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            text (str): Texte encodé.
+            embedding (list[float]): Embedding à stocker.
+        """
+        self.put_many(model, [text], [embedding])
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs du cache pour le processus courant.
+
+        Returns:
+            dict: Nombre de hits, de misses, taux de hit et nombre d'entrées stockées.
+        """
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            conn.close()
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
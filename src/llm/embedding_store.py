@@ -0,0 +1,226 @@
+"""
+Ce fichier contient le stockage persistant des embeddings des textes indexés (chunks, chapitres).
+"""
+
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+EMBEDDING_STORE_DIR = "cache/embedding_store"
+SQLITE_MAX_VARIABLES = 900  # Nombre de clés recherchées par requête SQL
+
+
+class EmbeddingStore:
+    """
+    Stockage des embeddings adressé par contenu, sans limite de taille.
+
+    Les vecteurs d'un modèle sont ajoutés à la suite dans un fichier float32 brut,
+    lu comme un tableau NumPy projeté en mémoire (memmap). Une table d'offsets SQLite
+    associe le hash du couple (modèle, texte) à la ligne du vecteur dans ce fichier.
+    Contrairement au cache des requêtes (`EmbeddingCache`), aucune entrée n'est
+    supprimée : reconstruire les index depuis la base ne nécessite aucun appel au
+    modèle. Les ajouts sont sérialisés par une transaction SQLite, ce qui permet de
+    partager le stockage entre plusieurs processus.
+    """
+
+    def __init__(self, directory: str = EMBEDDING_STORE_DIR):
+        """
+        Initialise le stockage des embeddings.
+
+        Args:
+            directory (str): Dossier contenant la table d'offsets et les fichiers de vecteurs.
+        """
+        self.directory = directory
+        self.db_path = os.path.join(directory, "offsets.db")
+        self.hits = 0
+        self.misses = 0
+        self._setup_done = False
+        self._vectors = {}
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Ouvre une connexion vers la table d'offsets et crée les tables si nécessaire.
+
+        Returns:
+            sqlite3.Connection: Connexion à la table d'offsets.
+        """
+        if not self._setup_done:
+            os.makedirs(self.directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+
+        if not self._setup_done:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS offsets (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                position INTEGER
+            )
+            ''')
+            conn.commit()
+            self._setup_done = True
+
+        return conn
+
+    def make_key(self, model: str, text: str) -> str:
+        """
+        Calcule la clé d'un texte pour un modèle donné.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            text (str): Texte encodé (tel quel : les textes indexés sont déjà normalisés).
+
+        Returns:
+            str: Clé SHA-256 du couple (modèle, texte).
+        """
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_vectors_path(self, model: str) -> str:
+        """
+        Retourne le chemin du fichier des vecteurs d'un modèle.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+
+        Returns:
+            str: Chemin du fichier float32.
+        """
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", model) + ".f32")
+
+    def _get_vectors(self, model: str, dim: int, min_rows: int) -> np.ndarray:
+        """
+        Retourne les vecteurs d'un modèle projetés en mémoire, en rouvrant la
+        projection si le fichier a grandi depuis.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            dim (int): Dimension des vecteurs.
+            min_rows (int): Nombre de lignes nécessaires.
+
+        Returns:
+            np.ndarray: Vecteurs (lecture seule).
+        """
+        with self._lock:
+            vectors = self._vectors.get(model)
+            if vectors is None or len(vectors) < min_rows:
+                path = self.get_vectors_path(model)
+                rows = os.path.getsize(path) // (dim * 4)
+                vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+                self._vectors[model] = vectors
+            return vectors
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """
+        Récupère les embeddings de plusieurs textes.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            texts (list[str]): Textes recherchés.
+
+        Returns:
+            list[list[float] | None]: Embeddings, dans l'ordre des textes (None si absent).
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        positions = {}
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+            if row is not None:
+                for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                    batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                    placeholders = ", ".join("?" for _ in batch)
+                    positions.update(conn.execute(
+                        f"SELECT key, position FROM offsets WHERE key IN ({placeholders})", batch
+                    ).fetchall())
+        finally:
+            conn.close()
+
+        embeddings = [None] * len(texts)
+        if positions:
+            vectors = self._get_vectors(model, row[0], max(positions.values()) + 1)
+            for i, key in enumerate(keys):
+                if key in positions:
+                    embeddings[i] = vectors[positions[key]].tolist()
+
+        with self._lock:
+            self.hits += len(texts) - embeddings.count(None)
+            self.misses += embeddings.count(None)
+        return embeddings
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]]):
+        """
+        Ajoute les embeddings de plusieurs textes (les textes déjà présents sont ignorés).
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            texts (list[str]): Textes encodés.
+            embeddings (list[list[float]]): Embeddings, dans l'ordre des textes.
+
+        Raises:
+            ValueError: Si la dimension des embeddings diffère de celle déjà stockée pour le modèle.
+        """
+        new_entries = dict(zip((self.make_key(model, text) for text in texts), embeddings))
+        if not new_entries:
+            return
+
+        dim = len(next(iter(new_entries.values())))
+        if any(len(embedding) != dim for embedding in new_entries.values()):
+            raise ValueError(f"Embeddings de dimensions différentes pour le modèle {model}")
+
+        conn = self._connect()
+        try:
+            # Transaction exclusive : un seul ajout à la fois, tous processus confondus
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR IGNORE INTO models (model, dim) VALUES (?, ?)", (model, dim))
+            stored_dim = conn.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()[0]
+            if stored_dim != dim:
+                raise ValueError(f"Dimension {dim} incompatible avec les embeddings stockés du modèle {model} ({stored_dim})")
+            keys = list(new_entries)
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ", ".join("?" for _ in batch)
+                for (key,) in conn.execute(f"SELECT key FROM offsets WHERE key IN ({placeholders})", batch):
+                    del new_entries[key]
+
+            if new_entries:
+                # Les lignes incomplètes (écriture interrompue) sont écrasées
+                path = self.get_vectors_path(model)
+                with open(path, "ab") as file:
+                    first_position = file.tell() // (dim * 4)
+                with open(path, "r+b") as file:
+                    file.seek(first_position * dim * 4)
+                    file.write(np.asarray(list(new_entries.values()), dtype=np.float32).tobytes())
+                    file.truncate()
+
+                conn.executemany(
+                    "INSERT INTO offsets (key, model, position) VALUES (?, ?, ?)",
+                    [(key, model, first_position + i) for i, key in enumerate(new_entries)],
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """
+        Retourne les statistiques d'utilisation du stockage.
+
+        Returns:
+            dict: Nombre de succès, d'échecs et d'embeddings stockés.
+        """
+        conn = self._connect()
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM offsets").fetchone()[0]
+        finally:
+            conn.close()
+        return {"hits": self.hits, "misses": self.misses, "entries": count}
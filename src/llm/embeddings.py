@@ -0,0 +1,417 @@
+"""
+Ce fichier contient les backends de génération d'embeddings.
+"""
+
+import os
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+import numpy as np
+import litellm
+from litellm.exceptions import RateLimitError
+
+from src.llm.rate_limiter import TokenBucket
+from src.preprocessing.preprocess import TextProcessor
+
+EMBEDDING_DIM = 1024  # Dimension des embeddings de mistral-embed
+HASHES_PER_FEATURE = 4  # Nombre de composantes non nulles de la projection d'un terme
+DEFAULT_EMBEDDING_BACKEND = "mistral"
+CHARS_PER_TOKEN = 3  # Estimation prudente du nombre de caractères par token (texte français)
+
+# Limites de l'API d'embedding de Mistral
+MISTRAL_MAX_BATCH_SIZE = 128  # Nombre maximal de textes par requête
+MISTRAL_MAX_BATCH_TOKENS = 16384  # Nombre maximal de tokens par requête
+DEFAULT_REQUESTS_PER_SECOND = 1
+DEFAULT_TOKENS_PER_MINUTE = 500_000
+DEFAULT_QUERY_REQUESTS_PER_SECOND = 1
+QUERY_BURST = 5  # Requêtes interactives autorisées en rafale
+
+MAX_RETRIES = 5  # Nouvelles tentatives après une erreur de limite de débit
+RETRY_BASE_DELAY = 1.0  # Attente avant la première nouvelle tentative, en secondes
+RETRY_MAX_DELAY = 60.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estime le nombre de tokens d'un texte, sans tokenizer.
+
+    Args:
+        text (str): Texte à encoder.
+
+    Returns:
+        int: Nombre de tokens estimé.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def get_retry_delay(attempt: int) -> float:
+    """
+    Calcule l'attente avant une nouvelle tentative (backoff exponentiel avec gigue).
+
+    Args:
+        attempt (int): Numéro de la tentative échouée (à partir de 0).
+
+    Returns:
+        float: Attente en secondes.
+    """
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class EmbeddingThroughput:
+    """
+    Compteurs de débit des embeddings générés, tous backends confondus.
+    """
+
+    def __init__(self):
+        """
+        Initialise les compteurs.
+        """
+        self.texts = 0
+        self.requests = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self.rate_limit_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, texts: int = 0, requests: int = 0, retries: int = 0, seconds: float = 0.0, rate_limit_wait: float = 0.0):
+        """
+        Ajoute une mesure aux compteurs.
+
+        Args:
+            texts (int): Nombre de textes encodés.
+            requests (int): Nombre de requêtes envoyées au backend.
+            retries (int): Nombre de nouvelles tentatives.
+            seconds (float): Durée de l'encodage, en secondes.
+            rate_limit_wait (float): Attente imposée par la limite de débit, en secondes.
+        """
+        with self._lock:
+            self.texts += texts
+            self.requests += requests
+            self.retries += retries
+            self.seconds += seconds
+            self.rate_limit_wait += rate_limit_wait
+
+    def summary(self) -> dict:
+        """
+        Retourne les compteurs et le débit moyen.
+
+        Returns:
+            dict: Textes, requêtes, nouvelles tentatives, durées et textes par seconde.
+        """
+        with self._lock:
+            return {
+                "texts": self.texts,
+                "requests": self.requests,
+                "retries": self.retries,
+                "seconds": self.seconds,
+                "rate_limit_wait": self.rate_limit_wait,
+                "texts_per_second": self.texts / self.seconds if self.seconds else 0.0,
+            }
+
+
+# Débit des embeddings partagé par tous les backends
+embedding_throughput = EmbeddingThroughput()
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface des backends d'embedding : encodage d'une liste de textes par lots.
+
+    Les textes sont découpés en lots respectant les limites du backend
+    (`max_batch_size` textes et `max_batch_tokens` tokens estimés par requête).
+    """
+
+    model = None
+    dim = EMBEDDING_DIM
+    # Les embeddings sont conservés dans le cache persistant (calcul coûteux ou payant)
+    cacheable = True
+    # Limites d'une requête (None : pas de limite)
+    max_batch_size = None
+    max_batch_tokens = None
+
+    def get_batches(self, texts: list[str]) -> list[list[str]]:
+        """
+        Découpe les textes en lots, dans l'ordre.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+
+        Returns:
+            list[list[str]]: Lots de textes.
+        """
+        batches = []
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if batch and (
+                (self.max_batch_size and len(batch) >= self.max_batch_size)
+                or (self.max_batch_tokens and batch_tokens + tokens > self.max_batch_tokens)
+            ):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @abstractmethod
+    def embed_batch(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Génère les embeddings d'un lot de textes, en une requête.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Encodage en masse (indexation) plutôt que requête interactive.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+
+    async def aembed_batch(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Version asynchrone de `embed_batch` (exécutée dans un thread par défaut).
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Encodage en masse (indexation) plutôt que requête interactive.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+        return await asyncio.to_thread(self.embed_batch, texts, bulk)
+
+    def embed(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Génère les embeddings de plusieurs textes, lot par lot.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Encodage en masse (indexation) plutôt que requête interactive.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+        start = time.perf_counter()
+        batches = self.get_batches(texts)
+        embeddings = [embedding for batch in batches for embedding in self.embed_batch(batch, bulk)]
+        embedding_throughput.record(texts=len(texts), requests=len(batches), seconds=time.perf_counter() - start)
+        return embeddings
+
+
+class MistralEmbeddingBackend(EmbeddingBackend):
+    """
+    Embeddings du modèle 'mistral-embed', via litellm.
+
+    Les requêtes d'indexation passent par deux seaux à jetons partagés par toutes les
+    instances (requêtes par seconde et tokens par minute, réglés sur le quota du compte par
+    les variables d'environnement EMBEDDING_REQUESTS_PER_SECOND et EMBEDDING_TOKENS_PER_MINUTE).
+    Les requêtes interactives (recherches) ont leur propre seau
+    (EMBEDDING_QUERY_REQUESTS_PER_SECOND) et ne font jamais la queue derrière une
+    indexation : elles consomment le quota partagé sans l'attendre, ce qui ralentit
+    d'autant l'indexation. Une erreur de limite de débit est retentée avec un backoff exponentiel.
+    """
+
+    model = "mistral/mistral-embed"
+    max_batch_size = MISTRAL_MAX_BATCH_SIZE
+    max_batch_tokens = MISTRAL_MAX_BATCH_TOKENS
+
+    requests_per_second = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND))
+    tokens_per_minute = float(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE))
+    request_limiter = TokenBucket(requests_per_second)
+    token_limiter = TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute)
+    query_limiter = TokenBucket(
+        float(os.getenv("EMBEDDING_QUERY_REQUESTS_PER_SECOND", DEFAULT_QUERY_REQUESTS_PER_SECOND)), capacity=QUERY_BURST
+    )
+
+    def acquire(self, tokens: int, bulk: bool) -> float:
+        """
+        Attend l'autorisation d'envoyer une requête.
+
+        Args:
+            tokens (int): Nombre de tokens estimé de la requête.
+            bulk (bool): Requête d'indexation (sinon requête interactive).
+
+        Returns:
+            float: Temps attendu en secondes.
+        """
+        if bulk:
+            return self.request_limiter.acquire() + self.token_limiter.acquire(tokens)
+        self.request_limiter.consume()
+        self.token_limiter.consume(tokens)
+        return self.query_limiter.acquire()
+
+    async def aacquire(self, tokens: int, bulk: bool) -> float:
+        """
+        Version asynchrone de `acquire`.
+
+        Args:
+            tokens (int): Nombre de tokens estimé de la requête.
+            bulk (bool): Requête d'indexation (sinon requête interactive).
+
+        Returns:
+            float: Temps attendu en secondes.
+        """
+        if bulk:
+            return await self.request_limiter.aacquire() + await self.token_limiter.aacquire(tokens)
+        self.request_limiter.consume()
+        self.token_limiter.consume(tokens)
+        return await self.query_limiter.aacquire()
+
+    def embed_batch(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Génère les embeddings d'un lot de textes en une requête à l'API, en respectant
+        les limites de débit et en retentant les erreurs de limite de débit.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Encodage en masse (indexation) plutôt que requête interactive.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+        tokens = sum(estimate_tokens(text) for text in texts)
+        for attempt in range(MAX_RETRIES + 1):
+            wait = self.acquire(tokens, bulk)
+            embedding_throughput.record(rate_limit_wait=wait)
+            try:
+                response = litellm.embedding(model=self.model, input=texts)
+                return [data["embedding"] for data in response["data"]]
+            except RateLimitError:
+                if attempt == MAX_RETRIES:
+                    raise
+                embedding_throughput.record(retries=1)
+                time.sleep(get_retry_delay(attempt))
+
+    async def aembed_batch(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Version asynchrone de `embed_batch` : les attentes ne bloquent pas la boucle d'événements.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Encodage en masse (indexation) plutôt que requête interactive.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+        tokens = sum(estimate_tokens(text) for text in texts)
+        for attempt in range(MAX_RETRIES + 1):
+            wait = await self.aacquire(tokens, bulk)
+            embedding_throughput.record(rate_limit_wait=wait)
+            try:
+                response = await litellm.aembedding(model=self.model, input=texts)
+                return [data["embedding"] for data in response["data"]]
+            except RateLimitError:
+                if attempt == MAX_RETRIES:
+                    raise
+                embedding_throughput.record(retries=1)
+                await asyncio.sleep(get_retry_delay(attempt))
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Embeddings locaux et déterministes, calculés sur CPU sans appel réseau.
+
+    Les textes sont normalisés et tokenisés comme par `TextProcessor`. Chaque mot et
+    chaque paire de mots consécutifs est projeté par hachage sur quelques composantes
+    signées (projection aléatoire creuse), pondéré par 1 + log(fréquence), puis le
+    vecteur est normalisé. Deux textes partageant des termes ont des embeddings proches,
+    ce qui suffit pour tester la charge de l'ingestion et de la recherche hors ligne.
+    Ces embeddings ne sont pas comparables à ceux de mistral-embed : un index construit
+    avec un backend ne doit pas être interrogé avec un autre.
+    """
+
+    cacheable = False
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        """
+        Initialise le backend.
+
+        Args:
+            dim (int): Dimension des embeddings.
+        """
+        self.dim = dim
+        self.model = f"local/hashing-{dim}"
+        self.processor = TextProcessor()
+
+    def get_features(self, text: str) -> list[str]:
+        """
+        Extrait les termes d'un texte : mots et paires de mots consécutifs.
+
+        Args:
+            text (str): Texte à encoder.
+
+        Returns:
+            list[str]: Termes du texte.
+        """
+        tokens = self.processor.tokenize_text(self.processor.normalize_text(text))
+        return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+    def get_projection(self, feature: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Retourne les composantes et les signes de la projection d'un terme (recalculée à
+        chaque appel : un hachage par terme, sans mémoire croissante avec le vocabulaire).
+
+        Args:
+            feature (str): Terme.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Indices des composantes et signes (+1 / -1).
+        """
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=4 * HASHES_PER_FEATURE).digest()
+        values = np.frombuffer(digest, dtype=np.uint32)
+        return (values >> 1) % self.dim, np.where(values & 1, 1.0, -1.0).astype(np.float32)
+
+    def embed_batch(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Génère les embeddings d'un lot de textes, localement.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Ignoré (aucune limite de débit).
+
+        Returns:
+            list[list[float]]: Embeddings normalisés, dans l'ordre des textes.
+        """
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self.get_features(text)).items():
+                indices, signs = self.get_projection(feature)
+                rows.append(np.full(HASHES_PER_FEATURE, row))
+                columns.append(indices)
+                values.append(signs * (1 + math.log(count)))
+
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(embeddings, (np.concatenate(rows), np.concatenate(columns)), np.concatenate(values))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms > 0, norms, 1)
+        return embeddings.tolist()
+
+
+EMBEDDING_BACKENDS = {
+    "mistral": MistralEmbeddingBackend,
+    "local": HashingEmbeddingBackend,
+}
+
+
+def get_embedding_backend(name: str | None = None) -> EmbeddingBackend:
+    """
+    Crée le backend d'embedding demandé.
+
+    Args:
+        name (str | None): Nom du backend (voir EMBEDDING_BACKENDS), variable
+            d'environnement EMBEDDING_BACKEND par défaut.
+
+    Returns:
+        EmbeddingBackend: Backend d'embedding.
+    """
+    name = name or os.getenv("EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND)
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Backend d'embedding inconnu : {name}")
+    return EMBEDDING_BACKENDS[name]()
@@ -0,0 +1,73 @@
+"""
+Ce fichier contient l'analyseur incrémental des tableaux JSON générés en streaming.
+"""
+
+import json
+
+
+class JSONArrayStream:
+    """
+    Analyse un tableau JSON d'objets reçu morceau par morceau.
+
+    Chaque objet de premier niveau est décodé dès que son accolade fermante est reçue,
+    sans attendre la fin du tableau. Le texte précédant le tableau (par exemple un bloc
+    de code Markdown « ```json ») est ignoré.
+    """
+
+    def __init__(self):
+        """
+        Initialise l'analyseur.
+        """
+        self.buffer = ""
+        self.items = []
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
+
+    def feed(self, text: str) -> list:
+        """
+        Ajoute un morceau de texte et retourne les objets complétés par ce morceau.
+
+        Args:
+            text (str): Morceau de texte reçu.
+
+        Returns:
+            list: Objets décodés depuis le dernier appel.
+        """
+        self.buffer += text
+        new_items = []
+
+        for position in range(self._position, len(self.buffer)):
+            char = self.buffer[position]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                # Recherche du début du tableau
+                if char == "[":
+                    self._depth = 1
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1 and char == "{":
+                    self._item_start = position
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and char == "}" and self._item_start is not None:
+                    try:
+                        new_items.append(json.loads(self.buffer[self._item_start:position + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+
+        self._position = len(self.buffer)
+        self.items.extend(new_items)
+        return new_items
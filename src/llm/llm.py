@@ -2,19 +2,158 @@
 Ce fichier contient le module pour gérer les modèles de langage.
 """
 
+import os
+import contextlib
 import litellm
 import time
+import asyncio
+import weakref
+from collections.abc import Iterator
+
+from src.llm.completion_cache import CompletionCache
+from src.llm.embedding_cache import EmbeddingCache
+from src.llm.embedding_store import EmbeddingStore
+from src.llm.embeddings import EmbeddingBackend, embedding_throughput, get_embedding_backend
+
+DEFAULT_EMBEDDING_CONCURRENCY = 4  # Nombre de requêtes d'embedding simultanées
+
+# Cache des embeddings partagé par toutes les instances (et tous les processus)
+embedding_cache = EmbeddingCache()
+
+# Stockage permanent des embeddings des textes indexés (chunks, chapitres)
+embedding_store = EmbeddingStore()
+
+# Cache des réponses des modèles de langage, utilisé sur demande de l'appelant
+completion_cache = CompletionCache()
+
+class EmbeddingDispatcher:
+    """
+    Répartiteur asynchrone des requêtes d'embedding.
+
+    Les textes sont découpés en lots par le backend et plusieurs lots sont envoyés
+    simultanément, dans la limite d'un sémaphore, au rythme autorisé par la limite de
+    débit du backend. Les embeddings sont retournés dans l'ordre des textes. Un texte
+    déjà en cours d'encodage pour un autre appelant n'est pas renvoyé au backend : les
+    deux appelants attendent la même requête.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_concurrency: int | None = None):
+        """
+        Initialise le répartiteur.
+
+        Args:
+            backend (EmbeddingBackend): Backend d'embedding.
+            max_concurrency (int | None): Nombre maximal de lots envoyés simultanément
+                (variable d'environnement EMBEDDING_MAX_CONCURRENCY par défaut).
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", DEFAULT_EMBEDDING_CONCURRENCY))
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        # Sémaphore, requêtes en cours et tâches, propres à chaque boucle d'événements
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _get_state(self) -> tuple[asyncio.Semaphore, dict, set]:
+        """
+        Retourne l'état du répartiteur pour la boucle d'événements courante.
+
+        Returns:
+            tuple[asyncio.Semaphore, dict, set]: Sémaphore, futures des textes en cours
+                d'encodage et tâches des lots en cours.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = (asyncio.Semaphore(self.max_concurrency), {}, set())
+            self._loops[loop] = state
+        return state
+
+    async def _run_batch(self, texts: list[str], semaphore: asyncio.Semaphore, in_flight: dict, bulk: bool):
+        """
+        Encode un lot et transmet les embeddings (ou l'erreur) aux appelants en attente.
+
+        Args:
+            texts (list[str]): Textes du lot.
+            semaphore (asyncio.Semaphore): Sémaphore limitant les lots d'indexation simultanés.
+            in_flight (dict): Futures des textes en cours d'encodage.
+            bulk (bool): Lot d'indexation (les lots interactifs n'attendent pas le sémaphore).
+        """
+        futures = [in_flight[text] for text in texts]
+        try:
+            async with semaphore if bulk else contextlib.nullcontext():
+                embeddings = await self.backend.aembed_batch(texts, bulk)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Le backend a retourné {len(embeddings)} embeddings pour {len(texts)} textes")
+            for future, embedding in zip(futures, embeddings):
+                future.set_result(embedding)
+        except Exception as error:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            for text, future in zip(texts, futures):
+                in_flight.pop(text, None)
+                future.cancel()
+
+    async def embed(self, texts: list[str], bulk: bool = False) -> list[list[float]]:
+        """
+        Génère les embeddings de plusieurs textes.
+
+        Args:
+            texts (list[str]): Textes à encoder.
+            bulk (bool): Encodage en masse (indexation) plutôt que requête interactive.
+
+        Returns:
+            list[list[float]]: Embeddings, dans l'ordre des textes.
+        """
+        semaphore, in_flight, tasks = self._get_state()
+        loop = asyncio.get_running_loop()
+
+        # Seuls les textes qui ne sont pas déjà en cours d'encodage sont envoyés
+        new_texts = []
+        for text in dict.fromkeys(texts):
+            if text not in in_flight:
+                in_flight[text] = loop.create_future()
+                new_texts.append(text)
+        futures = [in_flight[text] for text in texts]
+
+        start = time.perf_counter()
+        batches = self.backend.get_batches(new_texts)
+        for batch in batches:
+            task = asyncio.create_task(self._run_batch(batch, semaphore, in_flight, bulk))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Les futures sont partagées : l'annulation d'un appelant ne doit pas les annuler
+        embeddings = await asyncio.gather(*(asyncio.shield(future) for future in futures))
+        if new_texts:
+            embedding_throughput.record(texts=len(new_texts), requests=len(batches), seconds=time.perf_counter() - start)
+        return list(embeddings)
+
 
 class LLM:
     """
     Classe pour gérer les modèles de langage.
     """
+    def __init__(self, embedding_backend: EmbeddingBackend | None = None):
+        """
+        Initialise le gestionnaire des modèles de langage.
+
+        Args:
+            embedding_backend (EmbeddingBackend | None): Backend d'embedding (variable
+                d'environnement EMBEDDING_BACKEND par défaut, voir `get_embedding_backend`).
+        """
+        self.embedding_backend = embedding_backend or get_embedding_backend()
+        self.embedding_dispatcher = EmbeddingDispatcher(self.embedding_backend)
+
     def call_model(
         self,
         provider : str,
         model : str,
         temperature : float,
         prompt_dict : list[dict[str, str]],
+        use_cache : bool = False,
+        bypass_cache : bool = False,
     ) -> str:
         """
         Appelle le modèle de langage pour générer une réponse.
@@ -24,18 +163,80 @@ class LLM:
             model (str): Nom du modèle.
             temperature (float): Température de l'échantillonnage.
             prompt_dict (list): Liste des prompts.
+            use_cache (bool): Réutilise la réponse d'un appel identique si elle est en cache,
+                et met en cache la nouvelle réponse sinon.
+            bypass_cache (bool): Ignore la réponse en cache pour obtenir un nouvel échantillon
+                (qui remplace l'ancien si `use_cache` est activé).
 
         Returns:
             str: Réponse générée.
         """
+        if use_cache and not bypass_cache:
+            cached_response = completion_cache.get(provider, model, temperature, prompt_dict)
+            if cached_response is not None:
+                return cached_response
+
         response: litellm.ModelResponse = self._generate(
             provider, model, temperature, prompt_dict=prompt_dict
         )
         response_text = str(response.choices[0].message.content)
 
+        if use_cache:
+            completion_cache.put(provider, model, temperature, prompt_dict, response_text)
+
         return response_text
 
 
+    def call_model_stream(
+        self,
+        provider : str,
+        model : str,
+        temperature : float,
+        prompt_dict : list[dict[str, str]],
+        use_cache : bool = False,
+        bypass_cache : bool = False,
+    ) -> Iterator[str]:
+        """
+        Version en streaming de `call_model` : retourne les morceaux de la réponse
+        au fur et à mesure de leur génération.
+
+        Args:
+            provider (str): Nom du fournisseur.
+            model (str): Nom du modèle.
+            temperature (float): Température de l'échantillonnage.
+            prompt_dict (list): Liste des prompts.
+            use_cache (bool): Réutilise la réponse d'un appel identique si elle est en cache
+                (retournée en un seul morceau), et met en cache la réponse complète sinon.
+            bypass_cache (bool): Ignore la réponse en cache pour obtenir un nouvel échantillon.
+
+        Yields:
+            str: Morceau de la réponse.
+        """
+        if use_cache and not bypass_cache:
+            cached_response = completion_cache.get(provider, model, temperature, prompt_dict)
+            if cached_response is not None:
+                yield cached_response
+                return
+
+        response = litellm.completion(
+            model=f"{provider}/{model}",
+            messages=prompt_dict,
+            temperature=temperature,
+            stream=True,
+        )
+
+        parts = []
+        for chunk in response:
+            content = chunk.choices[0].delta.content
+            if content:
+                parts.append(content)
+                yield content
+
+        # La réponse n'est mise en cache que si elle a été entièrement reçue
+        if use_cache:
+            completion_cache.put(provider, model, temperature, prompt_dict, "".join(parts))
+
+
     def _generate(
         self,
         provider : str,
@@ -65,34 +266,125 @@ class LLM:
 
     def generate_prompt_embedding(self, prompt: str) -> list[float]:
         """
-        Génère un embedding pour le prompt en utilisant le modèle 'mistral-embed'.
+        Génère un embedding pour le prompt avec le backend d'embedding ('mistral-embed' par défaut).
+        Les embeddings déjà calculés sont lus depuis le cache persistant.
         """
-        model = "mistral/mistral-embed"
-        response = litellm.embedding(model=model, input=[prompt])
-        return response["data"][0]["embedding"]
+        return self.generate_prompts_embeddings([prompt])[0]
 
-    def generate_chunks_embeddings(self, chunk_list: list[tuple]) -> list[tuple]:
+    def get_known_embeddings(self, prompts: list[str]) -> tuple[list[list[float] | None], list[int]]:
         """
-        Génère des embeddings pour chaque chunk dans chunk_list.
-        Chaque chunk est une liste de tokens, et un embedding est généré pour chaque liste.
-        Retourne une liste de tuples (id_chunk, embedding).
+        Récupère les embeddings déjà calculés : d'abord dans le stockage des textes
+        indexés, puis dans le cache des requêtes.
+
+        Args:
+            prompts (list[str]): Textes à encoder.
+
+        Returns:
+            tuple[list[list[float] | None], list[int]]: Embeddings connus (None sinon)
+                et positions des textes à encoder.
+        """
+        model = self.embedding_backend.model
+        embeddings = embedding_store.get_many(model, prompts)
+        unknown = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        if unknown:
+            cached = embedding_cache.get_many(model, [prompts[position] for position in unknown])
+            for position, embedding in zip(unknown, cached):
+                embeddings[position] = embedding
+
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        return embeddings, missing
+
+    def save_embeddings(self, prompts: list[str], embeddings: list[list[float]], persist: bool):
+        """
+        Conserve des embeddings nouvellement calculés.
+
+        Args:
+            prompts (list[str]): Textes encodés.
+            embeddings (list[list[float]]): Embeddings, dans l'ordre des textes.
+            persist (bool): Stockage permanent (textes indexés) plutôt que cache borné (requêtes).
+        """
+        model = self.embedding_backend.model
+        if persist:
+            embedding_store.put_many(model, prompts, embeddings)
+        else:
+            embedding_cache.put_many(model, prompts, embeddings)
+
+    def generate_prompts_embeddings(self, prompts: list[str], persist: bool = False) -> list[list[float]]:
+        """
+        Génère les embeddings de plusieurs prompts, dans l'ordre, en une seule requête.
+        Seuls les prompts absents du stockage et du cache persistant sont envoyés au backend ;
+        `persist` (indexation) conserve les nouveaux embeddings dans le stockage permanent
+        et soumet les requêtes à la limite de débit de l'indexation.
         """
-        embeddings_with_ids = []
+        backend = self.embedding_backend
+        if not backend.cacheable:
+            return backend.embed(prompts, bulk=persist)
 
-        for chunk in chunk_list:
-            # Chaque chunk est un tuple (id, list of tokens)
-            chunk_id, chunk_tokens = chunk
+        embeddings, missing = self.get_known_embeddings(prompts)
 
-            # Joindre les tokens en une chaîne de texte
-            prompt = " ".join(chunk_tokens)
+        if missing:
+            missing_prompts = [prompts[position] for position in missing]
+            new_embeddings = backend.embed(missing_prompts, bulk=persist)
+            for position, embedding in zip(missing, new_embeddings):
+                embeddings[position] = embedding
+            self.save_embeddings(missing_prompts, new_embeddings, persist)
 
-            # Utiliser la fonction generate_prompt_embedding pour obtenir l'embedding
-            embedding = self.generate_prompt_embedding(prompt)
+        return embeddings
+
+    async def agenerate_prompt_embedding(self, prompt: str) -> list[float]:
+        """
+        Version asynchrone de `generate_prompt_embedding`.
+        """
+        return (await self.agenerate_prompts_embeddings([prompt]))[0]
+
+    async def agenerate_prompts_embeddings(self, prompts: list[str], persist: bool = False) -> list[list[float]]:
+        """
+        Version asynchrone de `generate_prompts_embeddings` : les requêtes au modèle
+        passent par le répartiteur (lots simultanés, requêtes partagées entre appelants)
+        et n'occupent pas de thread pendant l'attente de la réponse. Les lectures et
+        écritures SQLite du stockage et du cache sont exécutées dans un thread, pour ne
+        pas bloquer la boucle d'événements (attente de verrou, écriture sur disque).
+        """
+        backend = self.embedding_backend
+        if not backend.cacheable:
+            return await self.embedding_dispatcher.embed(prompts, bulk=persist)
 
-            # Ajouter un tuple (chunk_id, embedding) à la liste
-            embeddings_with_ids.append((chunk_id, embedding))
+        embeddings, missing = await asyncio.to_thread(self.get_known_embeddings, prompts)
 
-            #Pause 
-            time.sleep(2)
+        if missing:
+            missing_prompts = [prompts[position] for position in missing]
+            new_embeddings = await self.embedding_dispatcher.embed(missing_prompts, bulk=persist)
+            for position, embedding in zip(missing, new_embeddings):
+                embeddings[position] = embedding
+            await asyncio.to_thread(self.save_embeddings, missing_prompts, new_embeddings, persist)
+
+        return embeddings
+
+    def generate_texts_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """
+        Génère les embeddings d'une liste de textes à indexer (chunks, titres de chapitres).
+        Les textes déjà encodés sont lus dans le stockage permanent ; les autres sont
+        envoyés par lots simultanés par le répartiteur, au rythme autorisé par la limite
+        de débit du backend, puis ajoutés au stockage. Le débit est suivi par
+        `embedding_throughput`.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.agenerate_prompts_embeddings(texts, persist=True))
+
+        # Appel depuis une boucle d'événements : envoi séquentiel des lots
+        return self.generate_prompts_embeddings(texts, persist=True)
+
+    def generate_chunks_embeddings(self, chunk_list: list[tuple]) -> list[tuple]:
+        """
+        Génère des embeddings pour chaque chunk dans chunk_list.
+        Chaque chunk est une liste de tokens, et un embedding est généré pour chaque liste.
+        Retourne une liste de tuples (id_chunk, embedding).
+        """
+        # Chaque chunk est un tuple (id, list of tokens) : joindre les tokens en une chaîne de texte
+        chunk_ids = [chunk_id for chunk_id, _ in chunk_list]
+        prompts = [" ".join(chunk_tokens) for _, chunk_tokens in chunk_list]
 
-        return embeddings_with_ids
+        # Associer chaque embedding à l'identifiant de son chunk
+        return list(zip(chunk_ids, self.generate_texts_embeddings(prompts)))
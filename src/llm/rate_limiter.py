@@ -0,0 +1,89 @@
+"""
+Ce fichier contient le limiteur de débit (seau à jetons) des appels aux fournisseurs.
+"""
+
+import time
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """
+    Limiteur de débit à seau à jetons, partagé entre threads et tâches asynchrones.
+
+    Le seau se remplit de `rate` jetons par seconde, jusqu'à `capacity` jetons. Une
+    demande consomme ses jetons immédiatement, quitte à rendre le solde négatif, et
+    attend le temps nécessaire pour que le solde redevienne positif : les demandes
+    sont servies dans l'ordre d'arrivée et une demande plus grosse que le seau n'est
+    jamais bloquée indéfiniment.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        """
+        Initialise le seau, plein.
+
+        Args:
+            rate (float): Nombre de jetons ajoutés par seconde.
+            capacity (float | None): Nombre maximal de jetons (rafale autorisée), `rate` par défaut.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Consomme des jetons et retourne le temps d'attente avant de pouvoir les utiliser.
+
+        Args:
+            tokens (float): Nombre de jetons demandés.
+
+        Returns:
+            float: Temps d'attente en secondes.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Attend que des jetons soient disponibles.
+
+        Args:
+            tokens (float): Nombre de jetons demandés.
+
+        Returns:
+            float: Temps attendu en secondes.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def consume(self, tokens: float = 1):
+        """
+        Consomme des jetons sans attendre : les demandes suivantes attendront d'autant plus.
+
+        Args:
+            tokens (float): Nombre de jetons consommés.
+        """
+        self._reserve(tokens)
+
+    async def aacquire(self, tokens: float = 1) -> float:
+        """
+        Version asynchrone de `acquire` : l'attente ne bloque pas la boucle d'événements.
+
+        Args:
+            tokens (float): Nombre de jetons demandés.
+
+        Returns:
+            float: Temps attendu en secondes.
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
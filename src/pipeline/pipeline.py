@@ -4,6 +4,7 @@ Ce fichier contient le pipeline de traitement des données des informations d'un
 
 import os
 from io import BytesIO
+from collections.abc import Callable
 import requests
 import yt_dlp
 import streamlit as st
@@ -119,20 +120,53 @@ class Pipeline:
         else:
             return self.get_transcription(chunks[0])
 
-    def transcription_enhancement(self, transcription: str) -> str:
+    def generate_text(self, prompt_dict: list[dict[str, str]], temperature: float, on_progress: Callable[[str], None] | None = None) -> str:
+        """
+        Génère un texte avec le modèle de langage, en streaming si un suivi est demandé.
+
+        Args:
+            prompt_dict (list): Liste des prompts.
+            temperature (float): Température de l'échantillonnage.
+            on_progress (Callable[[str], None] | None): Fonction appelée avec le texte
+                généré jusque-là, à chaque morceau reçu.
+
+        Returns:
+            str: Texte généré.
+        """
+        if on_progress is None:
+            return self.llm.call_model(
+                provider="mistral",
+                model="mistral-large-latest",
+                temperature=temperature,
+                prompt_dict=prompt_dict,
+                use_cache=True,
+            )
+
+        text = ""
+        for content in self.llm.call_model_stream(
+            provider="mistral",
+            model="mistral-large-latest",
+            temperature=temperature,
+            prompt_dict=prompt_dict,
+            use_cache=True,
+        ):
+            text += content
+            on_progress(text)
+        return text
+
+    def transcription_enhancement(self, transcription: str, on_progress: Callable[[str], None] | None = None) -> str:
         """
         Améliore la transcription en utilisant un modèle de langage.
 
         Args:
             transcription (str): Transcription à améliorer.
+            on_progress (Callable[[str], None] | None): Suivi de la génération (voir `generate_text`).
 
         Returns:
             str: Transcription améliorée.
         """
 
-        transcription = self.llm.call_model(
-            provider="mistral",
-            model="mistral-large-latest",
+        transcription = self.generate_text(
             temperature=0.5,
             prompt_dict=[
                 {
@@ -140,22 +174,22 @@ class Pipeline:
                     "content": f"Tu es une intelligence artificielle spécialisée dans la transcription de l'audio des vidéos des enseignements de Monsieur Ricco Rakotomalala. À partir de la transcription qui est fournie, corrige et améliore ce texte pour obtenir un Français clair, fluide et sans fautes. Assure-toi d’éliminer les répétitions ou erreurs éventuelles, et préserve le sens général de la vidéo sans changer ni supprimer d'informations : {transcription}",
                 }
             ],
+            on_progress=on_progress,
         )
         return transcription
 
-    def create_summary(self, transcription: str) -> str:
+    def create_summary(self, transcription: str, on_progress: Callable[[str], None] | None = None) -> str:
         """
         Crée un résumé de la transcription.
 
         Args:
             transcription (str): Transcription de la vidéo.
+            on_progress (Callable[[str], None] | None): Suivi de la génération (voir `generate_text`).
 
         Returns:
             str: Résumé de la transcription.
         """
-        summary = self.llm.call_model(
-            provider="mistral",
-            model="mistral-large-latest",
+        summary = self.generate_text(
             temperature=0.7,
             prompt_dict=[
                 {
@@ -163,6 +197,7 @@ class Pipeline:
                     "content": f"Tu es une intelligence artificielle spécialisée dans la création de résumé de transcription audio des vidéos des enseignements de Monsieur Ricco Rakotomalala. À partir de la transcription qui est fournie, créé un résumé concis et qui reflète les idées principales de la vidéo : {transcription}",
                 }
             ],
+            on_progress=on_progress,
         )
         return summary
 
@@ -1,21 +1,43 @@
 import sqlite3
 import numpy as np
-import faiss
-import time
 from src.llm.llm import LLM
+from src.llm.embeddings import EmbeddingBackend
+from src.search_engine.index_factory import (
+    build_index,
+    can_train,
+    get_index_settings,
+    get_training_minimum,
+    load_index,
+    maybe_promote,
+    rebuild_index,
+    save_index,
+)
+from src.search_engine.faiss_ids import encode_ids
 
 class Pipeline_Chapters_Faiss:
-    def __init__(self):
-        """Initialise la pipeline avec la base de données, l'index Faiss et le modèle LLM."""
+    def __init__(
+        self,
+        index_type: str | None = None,
+        promotion_threshold: int | None = None,
+        embedding_backend: EmbeddingBackend | None = None,
+    ):
+        """Initialise la pipeline avec la base de données, l'index Faiss et le modèle LLM.
+
+        L'index reste exhaustif jusqu'à `promotion_threshold` vecteurs, puis est reconstruit
+        dans le type `index_type` (voir `index_factory.INDEX_TYPES`). Les formats compressés
+        ("sq8", "sq_fp16", "pq") peuvent aussi être appliqués directement via `rebuild_index`.
+        `embedding_backend` choisit le backend d'embedding (EMBEDDING_BACKEND par défaut).
+        """
         self.db_path = "src/videos_youtube.db"
-        self.index = faiss.read_index("indexs/faiss_index_chapters.bin")
-        self.llm = LLM()
+        self.index = load_index("indexs/faiss_index_chapters.bin", mmap=False)
+        self.index_settings = get_index_settings(index_type=index_type, promotion_threshold=promotion_threshold)
+        self.llm = LLM(embedding_backend)
 
     def get_chapters(self, id_video: int) -> str:
         """Récupère les chapitres d'une vidéo depuis la base de données."""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute(f"SELECT id, video_id, subtitle FROM video_chapters WHERE video_id = {id_video}")
+        cursor.execute(f"SELECT id, video_id, subtitle FROM video_chapters WHERE video_id = {id_video} ORDER BY id")
         results = cursor.fetchall()
         conn.close()
 
@@ -24,26 +46,35 @@ class Pipeline_Chapters_Faiss:
         else:
             return results
 
+    def get_chapter_ids(self, results) -> np.ndarray:
+        """Encode les identifiants Faiss des chapitres (triés par id dans chaque vidéo).
+
+        L'identifiant local est le numéro d'ordre du chapitre dans sa vidéo (à partir de 1),
+        et non `video_chapters.id` (auto-incrémenté sur toute la base, il dépasserait
+        `LOCAL_ID_BASE`).
+        """
+        ordinals = []
+        counts = {}
+        for _, video_id, _ in results:
+            counts[video_id] = counts.get(video_id, 0) + 1
+            ordinals.append(counts[video_id])
+        return encode_ids([video_id for _, video_id, _ in results], ordinals)
+
     def get_chapters_embeddings_ids(self, results):
         """Génère les embeddings des chapitres"""
         # Extraire uniquement les titres (le troisième élément de chaque tuple)
         chapters = [chap for _, _, chap in results]
 
-        #Initialisation d'une liste pour les embeddings des chapitres 
-        list_embd = []
-
         #Génère les embeddings
-        for chap in chapters:
-            list_embd.append(self.llm.generate_prompt_embedding(chap))
-            time.sleep(2)
+        list_embd = self.llm.generate_texts_embeddings(chapters)
 
         #Générer la liste des nouveaux IDs
-        new_ids = [f"{grp:03}{id_:04}" for id_, grp, _ in results]
+        new_ids = self.get_chapter_ids(results)
 
         return [list_embd, new_ids]
 
 
-    def add_embed_to_index(self, embd_ids_list: list[list[str], list[float]]):
+    def add_embed_to_index(self, embd_ids_list: list[list[float], np.ndarray]):
         """Ajoute les embeddings des chapitres à l'index Faiss."""
         # Convertir les embeddings en tableau NumPy
         embeddings = np.array(embd_ids_list[0]).astype(np.float32)
@@ -54,11 +85,55 @@ class Pipeline_Chapters_Faiss:
         # Ajouter les embeddings à l'index Faiss avec les IDs
         self.index.add_with_ids(embeddings, ids)
 
+        # Promotion de l'index si le corpus a dépassé le seuil
+        self.index = maybe_promote(
+            self.index, self.index_settings["index_type"], self.index_settings["promotion_threshold"]
+        )
+
         # Sauvegarde des modifications
-        faiss.write_index(self.index, "indexs/faiss_index_chapters.bin")
+        save_index(self.index, "indexs/faiss_index_chapters.bin", ondisk=self.index_settings["ondisk"])
 
         print(f"Ajouté {len(embd_ids_list)} embeddings à l'index Faiss.")
 
+    def rebuild_index(self, index_type: str):
+        """Reconstruit l'index Faiss dans le type demandé (par exemple pour ré-entraîner un IVF)."""
+        if not can_train(index_type, self.index.ntotal):
+            print(f"Index Faiss non reconstruit : le type '{index_type}' nécessite au moins "
+                  f"{get_training_minimum(index_type)} vecteurs ({self.index.ntotal} disponibles).")
+            return
+        self.index = rebuild_index(self.index, index_type)
+        save_index(self.index, "indexs/faiss_index_chapters.bin", ondisk=self.index_settings["ondisk"])
+        print(f"Index Faiss reconstruit au format '{index_type}' ({self.index.ntotal} vecteurs).")
+
+    def rebuild_index_from_db(self, index_type: str | None = None):
+        """Reconstruit l'index Faiss à partir des chapitres de la base de données.
+
+        Les embeddings déjà calculés sont lus dans le stockage permanent : seuls les chapitres
+        jamais encodés sont envoyés au modèle. Sans `index_type`, l'index est exhaustif
+        tant que le corpus reste sous le seuil de promotion.
+        """
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT id, video_id, subtitle FROM video_chapters ORDER BY video_id, id").fetchall()
+        conn.close()
+
+        if not rows:
+            print("Aucun élément à indexer : l'index Faiss n'est pas reconstruit.")
+            return
+
+        embeddings = self.llm.generate_texts_embeddings([subtitle for _, _, subtitle in rows])
+        ids = self.get_chapter_ids(rows)
+
+        if index_type is None:
+            below_threshold = len(rows) < self.index_settings["promotion_threshold"]
+            index_type = "flat" if below_threshold else self.index_settings["index_type"]
+        if not can_train(index_type, len(rows)):
+            print(f"Le type '{index_type}' nécessite au moins {get_training_minimum(index_type)} vecteurs : index exhaustif.")
+            index_type = "flat"
+
+        self.index = build_index(index_type, np.array(embeddings, dtype=np.float32), ids)
+        save_index(self.index, "indexs/faiss_index_chapters.bin", ondisk=self.index_settings["ondisk"])
+        print(f"Index Faiss reconstruit depuis la base au format '{index_type}' ({self.index.ntotal} vecteurs).")
+
     def run_pipeline(self, id_video: int):
         """Exécute tout le pipeline pour un id_video donné."""
         print(f"Démarrage du pipeline 'Chapitres' pour la vidéo ID {id_video}.")
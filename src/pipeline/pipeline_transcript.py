@@ -1,17 +1,42 @@
 import sqlite3
 import numpy as np
-import faiss
 from src.llm.llm import LLM
+from src.llm.embeddings import EmbeddingBackend
+from src.search_engine.index_factory import (
+    build_index,
+    can_train,
+    get_index_settings,
+    get_training_minimum,
+    load_index,
+    maybe_promote,
+    rebuild_index,
+    save_index,
+)
+from src.db.db_youtube import YouTubeManager
 from src.preprocessing.preprocess import TextProcessor
+from src.search_engine.faiss_ids import encode_id, decode_id
 
 processor = TextProcessor()
 
 class Pipeline_Transcript_Faiss:
-    def __init__(self):
-        """Initialise la pipeline avec la base de données, l'index Faiss et le modèle LLM."""
+    def __init__(
+        self,
+        index_type: str | None = None,
+        promotion_threshold: int | None = None,
+        embedding_backend: EmbeddingBackend | None = None,
+    ):
+        """Initialise la pipeline avec la base de données, l'index Faiss et le modèle LLM.
+
+        L'index reste exhaustif jusqu'à `promotion_threshold` vecteurs, puis est reconstruit
+        dans le type `index_type` (voir `index_factory.INDEX_TYPES`). Les formats compressés
+        ("sq8", "sq_fp16", "pq") peuvent aussi être appliqués directement via `rebuild_index`.
+        `embedding_backend` choisit le backend d'embedding (EMBEDDING_BACKEND par défaut).
+        """
         self.db_path = "src/videos_youtube.db"
-        self.index = faiss.read_index("indexs/faiss_index_transcripts.bin")
-        self.llm = LLM()
+        self.index = load_index("indexs/faiss_index_transcripts.bin", mmap=False)
+        self.index_settings = get_index_settings(index_type=index_type, promotion_threshold=promotion_threshold)
+        self.llm = LLM(embedding_backend)
+        self.db_manager = YouTubeManager(self.db_path)
         self.processor = processor
 
     def get_transcription(self, id_video: int) -> str:
@@ -27,7 +52,7 @@ class Pipeline_Transcript_Faiss:
         else:
             raise ValueError(f"No transcription found for video id {id_video}")
 
-    def generate_chunk_ids(self, input_list: list[tuple[int, str | None]]) -> list[tuple[str, list[str]]]:
+    def generate_chunk_ids(self, input_list: list[tuple[int, str | None]]) -> list[tuple[int, list[str]]]:
         """Génère une liste d'ID de chunks avec tokenisation et découpage."""
         chunk_list = []
 
@@ -39,19 +64,13 @@ class Pipeline_Transcript_Faiss:
             chunks = self.processor.process_text(text)
 
             for chunk_id, chunk in enumerate(chunks, start=1):
-                formatted_id = f"{original_id:03d}{chunk_id:04d}"
-                chunk_list.append((formatted_id, chunk))
+                chunk_list.append((encode_id(original_id, chunk_id), chunk))
 
         return chunk_list
 
-    def add_chunk_to_db(self, chunk_list: list[tuple[str, list[str]]]):
+    def add_chunk_to_db(self, chunk_list: list[tuple[int, list[str]]]):
         """Ajoute les chunks à la base de données après avoir joint les tokens."""
-        if len(str(chunk_list[0][0])) == 5:
-            vid_id = str(chunk_list[0][0])[:1]
-        elif len(str(chunk_list[0][0])) == 6:
-            vid_id = str(chunk_list[0][0])[:2]
-        else :
-            vid_id = str(chunk_list[0][0])[:3]
+        vid_id, _ = decode_id(chunk_list[0][0])
 
         # Connexion à la base de données
         conn = sqlite3.connect(self.db_path)
@@ -65,11 +84,14 @@ class Pipeline_Transcript_Faiss:
             cursor.execute("INSERT INTO chunks (id, video_id, chunks) VALUES (?, ?, ?)", 
                            (chunk_id, vid_id, chunk_data))
 
+        # Estimer la position temporelle des chunks dans la vidéo
+        self.db_manager.update_chunks_spans(cursor, vid_id)
+
         # Commit des changements et fermeture de la connexion
         conn.commit()
         conn.close()
 
-    def add_embed_to_index(self, chunk_list: list[tuple[str, list[str]]]):
+    def add_embed_to_index(self, chunk_list: list[tuple[int, list[str]]]):
         """Ajoute les embeddings des chunks à l'index Faiss."""
         # Générer les embeddings
         embeddings_with_ids = self.llm.generate_chunks_embeddings(chunk_list)
@@ -86,11 +108,55 @@ class Pipeline_Transcript_Faiss:
         # Ajouter les embeddings à l'index Faiss avec les IDs
         self.index.add_with_ids(np.array(embeddings, dtype=np.float32), np.array(ids, dtype=np.int64))
 
+        # Promotion de l'index si le corpus a dépassé le seuil
+        self.index = maybe_promote(
+            self.index, self.index_settings["index_type"], self.index_settings["promotion_threshold"]
+        )
+
         # Sauvegarde des modifications
-        faiss.write_index(self.index, "indexs/faiss_index_transcripts.bin")
+        save_index(self.index, "indexs/faiss_index_transcripts.bin", ondisk=self.index_settings["ondisk"])
 
         print(f"Ajouté {len(embeddings_with_ids)} embeddings à l'index Faiss.")
 
+    def rebuild_index(self, index_type: str):
+        """Reconstruit l'index Faiss dans le type demandé (par exemple pour ré-entraîner un IVF)."""
+        if not can_train(index_type, self.index.ntotal):
+            print(f"Index Faiss non reconstruit : le type '{index_type}' nécessite au moins "
+                  f"{get_training_minimum(index_type)} vecteurs ({self.index.ntotal} disponibles).")
+            return
+        self.index = rebuild_index(self.index, index_type)
+        save_index(self.index, "indexs/faiss_index_transcripts.bin", ondisk=self.index_settings["ondisk"])
+        print(f"Index Faiss reconstruit au format '{index_type}' ({self.index.ntotal} vecteurs).")
+
+    def rebuild_index_from_db(self, index_type: str | None = None):
+        """Reconstruit l'index Faiss à partir des chunks de la base de données.
+
+        Les embeddings déjà calculés sont lus dans le stockage permanent : seuls les chunks
+        jamais encodés sont envoyés au modèle. Sans `index_type`, l'index est exhaustif
+        tant que le corpus reste sous le seuil de promotion.
+        """
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT id, chunks FROM chunks ORDER BY id").fetchall()
+        conn.close()
+
+        if not rows:
+            print("Aucun élément à indexer : l'index Faiss n'est pas reconstruit.")
+            return
+
+        embeddings = self.llm.generate_texts_embeddings([text for _, text in rows])
+        ids = np.array([chunk_id for chunk_id, _ in rows], dtype=np.int64)
+
+        if index_type is None:
+            below_threshold = len(rows) < self.index_settings["promotion_threshold"]
+            index_type = "flat" if below_threshold else self.index_settings["index_type"]
+        if not can_train(index_type, len(rows)):
+            print(f"Le type '{index_type}' nécessite au moins {get_training_minimum(index_type)} vecteurs : index exhaustif.")
+            index_type = "flat"
+
+        self.index = build_index(index_type, np.array(embeddings, dtype=np.float32), ids)
+        save_index(self.index, "indexs/faiss_index_transcripts.bin", ondisk=self.index_settings["ondisk"])
+        print(f"Index Faiss reconstruit depuis la base au format '{index_type}' ({self.index.ntotal} vecteurs).")
+
     def run_pipeline(self, id_video: int):
         """Exécute tout le pipeline pour un id_video donné."""
         print(f"Démarrage du pipeline pour la vidéo ID {id_video}.")
@@ -0,0 +1,152 @@
+"""
+Ce fichier contient l'exécuteur qui regroupe les recherches FAISS concurrentes.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import faiss
+
+from src.search_engine.filters import search_index
+
+
+class SearchBatcher:
+    """
+    Regroupe les recherches FAISS lancées en même temps par plusieurs sessions.
+
+    Les requêtes reçues pendant une courte fenêtre (dans la limite de `max_batch_size`
+    vecteurs) sont envoyées à FAISS en une seule recherche matricielle, puis les
+    résultats sont redistribués à chaque appelant. Les recherches avec paramètres
+    (recherches filtrées) et les lots déjà plus grands que la limite sont exécutés
+    seuls, mais par le même thread : toutes les recherches FAISS passent par ce thread
+    et le pool OpenMP de FAISS n'est donc jamais sollicité par plusieurs recherches
+    concurrentes.
+    """
+
+    def __init__(
+        self,
+        get_index,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        omp_threads: int | None = None,
+    ):
+        """
+        Initialise l'exécuteur et démarre son thread de recherche.
+
+        Args:
+            get_index (callable): Fonction retournant l'index courant (appelée à chaque lot,
+                pour suivre les rechargements).
+            max_batch_size (int): Nombre maximal de vecteurs de requête par lot.
+            max_wait_ms (float): Durée maximale d'attente d'autres requêtes, en millisecondes.
+            omp_threads (int | None): Nombre de threads OpenMP de FAISS (variable
+                d'environnement FAISS_OMP_THREADS par défaut).
+        """
+        self.get_index = get_index
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        omp_threads = omp_threads or int(os.getenv("FAISS_OMP_THREADS", "0"))
+        if omp_threads > 0:
+            faiss.omp_set_num_threads(omp_threads)
+
+        self._queue = queue.Queue()
+        self._pending = None
+        self._thread = threading.Thread(target=self._run, name="faiss-search-batcher", daemon=True)
+        self._thread.start()
+
+    def search(
+        self, queries: np.ndarray, k: int, params: faiss.SearchParameters | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Recherche les k plus proches voisins des requêtes, en les regroupant avec celles des autres appelants.
+
+        Args:
+            queries (np.ndarray): Vecteurs de requête (une ligne par requête).
+            k (int): Nombre de voisins.
+            params (faiss.SearchParameters | None): Paramètres de recherche (filtre), la
+                recherche n'est alors pas regroupée.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Distances et identifiants, comme `faiss.Index.search`.
+        """
+        return self.submit(queries, k, params).result()
+
+    def submit(self, queries: np.ndarray, k: int, params: faiss.SearchParameters | None = None) -> Future:
+        """
+        Ajoute des requêtes au prochain lot sans attendre le résultat.
+
+        Args:
+            queries (np.ndarray): Vecteurs de requête (une ligne par requête).
+            k (int): Nombre de voisins.
+            params (faiss.SearchParameters | None): Paramètres de recherche (filtre), la
+                recherche n'est alors pas regroupée.
+
+        Returns:
+            Future: Résultat futur (distances, identifiants), utilisable avec `asyncio.wrap_future`.
+        """
+        future = Future()
+        self._queue.put((np.ascontiguousarray(queries, dtype=np.float32), k, params, future))
+        return future
+
+    def _next_batch(self) -> list[tuple]:
+        """
+        Constitue le prochain lot : requêtes sans paramètres arrivées pendant la fenêtre
+        d'attente, dans la limite de `max_batch_size` vecteurs.
+
+        Returns:
+            list[tuple]: Requêtes (vecteurs, k, paramètres, future) du lot.
+        """
+        first, self._pending = self._pending or self._queue.get(), None
+        batch = [first]
+        rows = len(first[0])
+        if first[2] is not None:
+            return batch
+
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            # Une requête qui ne peut pas rejoindre le lot ouvre le suivant
+            if item[2] is not None or rows + len(item[0]) > self.max_batch_size:
+                self._pending = item
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _run(self):
+        """
+        Boucle du thread de recherche : constitue les lots et les exécute.
+        """
+        while True:
+            self._execute(self._next_batch())
+
+    def _execute(self, batch: list[tuple]):
+        """
+        Exécute un lot de requêtes en une recherche FAISS et transmet les résultats.
+
+        Args:
+            batch (list[tuple]): Requêtes (vecteurs, k, paramètres, future) du lot.
+        """
+        try:
+            k = max(item[1] for item in batch)
+            queries = np.vstack([item[0] for item in batch])
+            distances, ids = search_index(self.get_index(), queries, k, batch[0][2])
+        except Exception as e:
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for queries, item_k, _, future in batch:
+            end = start + len(queries)
+            future.set_result((distances[start:end, :item_k], ids[start:end, :item_k]))
+            start = end
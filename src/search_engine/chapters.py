@@ -0,0 +1,63 @@
+"""
+Ce fichier contient l'index des intervalles de chapitres utilisé par le moteur de recherche.
+"""
+
+import bisect
+import sqlite3
+
+
+class ChapterIntervalIndex:
+    """
+    Associe une position dans une vidéo (en secondes) au chapitre qui la contient.
+
+    Les chapitres de chaque vidéo sont triés par début : la recherche d'un chapitre
+    est une recherche dichotomique en O(log n).
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Charge les intervalles de chapitres depuis la base de données.
+
+        Args:
+            db_path (str): Chemin vers la base de données SQLite.
+        """
+        self.db_path = db_path
+        self._starts = {}
+        self._chapters = {}
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT video_id, id, start_seconds, end_seconds
+            FROM video_chapters
+            WHERE start_seconds IS NOT NULL
+            ORDER BY video_id, start_seconds, id
+        ''')
+        for video_id, chapter_id, start_seconds, end_seconds in cursor.fetchall():
+            self._starts.setdefault(video_id, []).append(start_seconds)
+            self._chapters.setdefault(video_id, []).append((chapter_id, start_seconds, end_seconds))
+        conn.close()
+
+    def lookup(self, video_id: int, second: int | None) -> tuple[int, int] | None:
+        """
+        Retourne le chapitre de la vidéo qui contient la position donnée.
+
+        Args:
+            video_id (int): Identifiant de la vidéo.
+            second (int | None): Position dans la vidéo, en secondes.
+
+        Returns:
+            tuple[int, int] | None: Identifiant et début (en secondes) du chapitre, sinon None.
+        """
+        starts = self._starts.get(video_id)
+        if not starts or second is None:
+            return None
+
+        position = bisect.bisect_right(starts, second) - 1
+        if position < 0:
+            return None
+
+        chapter_id, start_seconds, end_seconds = self._chapters[video_id][position]
+        if end_seconds is not None and second >= end_seconds:
+            return None
+        return chapter_id, start_seconds
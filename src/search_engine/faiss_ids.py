@@ -0,0 +1,80 @@
+"""
+Ce fichier contient l'encodage des identifiants utilisés dans les index FAISS.
+
+Un identifiant FAISS regroupe l'identifiant de la vidéo et un identifiant local
+(numéro du chunk dans la vidéo ou identifiant du chapitre) :
+`faiss_id = video_id * LOCAL_ID_BASE + local_id`. La base décimale conserve la
+compatibilité avec les index et la table `chunks` existants (1500001 correspond
+au chunk 1 de la vidéo 150), sans limite sur le nombre de vidéos.
+"""
+
+import numpy as np
+
+LOCAL_ID_BASE = 10_000
+
+
+def encode_id(video_id: int, local_id: int) -> int:
+    """
+    Encode un couple (vidéo, identifiant local) en identifiant FAISS.
+
+    Args:
+        video_id (int): Identifiant de la vidéo.
+        local_id (int): Identifiant local (chunk ou chapitre).
+
+    Returns:
+        int: Identifiant FAISS.
+    """
+    if not 0 <= local_id < LOCAL_ID_BASE:
+        raise ValueError(f"Identifiant local hors limites : {local_id}")
+    return int(video_id) * LOCAL_ID_BASE + int(local_id)
+
+
+def decode_id(faiss_id: int) -> tuple[int, int]:
+    """
+    Décode un identifiant FAISS en couple (vidéo, identifiant local).
+
+    Args:
+        faiss_id (int): Identifiant FAISS.
+
+    Returns:
+        tuple[int, int]: Identifiant de la vidéo et identifiant local.
+    """
+    video_id, local_id = divmod(int(faiss_id), LOCAL_ID_BASE)
+    return video_id, local_id
+
+
+def encode_ids(video_ids, local_ids) -> np.ndarray:
+    """
+    Version vectorisée de `encode_id`.
+
+    Args:
+        video_ids (array-like): Identifiants des vidéos.
+        local_ids (array-like): Identifiants locaux.
+
+    Returns:
+        np.ndarray: Identifiants FAISS (int64).
+    """
+    video_ids = np.asarray(video_ids, dtype=np.int64)
+    local_ids = np.asarray(local_ids, dtype=np.int64)
+    if np.any((local_ids < 0) | (local_ids >= LOCAL_ID_BASE)):
+        raise ValueError("Identifiant local hors limites")
+    return video_ids * LOCAL_ID_BASE + local_ids
+
+
+def decode_ids(faiss_ids) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Version vectorisée de `decode_id`, applicable à une matrice de résultats FAISS.
+    Les positions sans résultat (-1) restent à -1.
+
+    Args:
+        faiss_ids (array-like): Identifiants FAISS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Identifiants des vidéos et identifiants locaux.
+    """
+    faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+    video_ids, local_ids = np.divmod(faiss_ids, LOCAL_ID_BASE)
+    missing = faiss_ids < 0
+    video_ids[missing] = -1
+    local_ids[missing] = -1
+    return video_ids, local_ids
@@ -0,0 +1,223 @@
+"""
+Ce fichier contient les filtres de métadonnées (tags, date de mise en ligne, durée)
+appliqués à l'intérieur de la recherche FAISS.
+"""
+
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+
+from src.search_engine.index_factory import INDEX_TYPES, get_index_type
+
+SELECTOR_CACHE_SIZE = 64  # Nombre de filtres dont le sélecteur est conservé
+
+# Classe des paramètres de recherche acceptée par chaque type d'index
+SEARCH_PARAMETERS_CLASSES = {
+    "flat": faiss.SearchParameters,
+    "sq8": faiss.SearchParameters,
+    "sq_fp16": faiss.SearchParameters,
+    "pq": faiss.SearchParametersPQ,  # Sélecteur appliqué par `search_index`
+    "ivf_flat": faiss.SearchParametersIVF,
+    "ivf_pq": faiss.SearchParametersIVF,
+    "hnsw": faiss.SearchParametersHNSW,
+}
+if set(SEARCH_PARAMETERS_CLASSES) != set(INDEX_TYPES):
+    raise RuntimeError("SEARCH_PARAMETERS_CLASSES doit couvrir chaque type de INDEX_TYPES")
+
+
+class SearchFilter:
+    """
+    Restreint la recherche aux vidéos vérifiant toutes les conditions renseignées.
+    """
+
+    def __init__(
+        self,
+        tags: list[str] | None = None,
+        upload_date_min: str | None = None,
+        upload_date_max: str | None = None,
+        duration_min: int | None = None,
+        duration_max: int | None = None,
+    ):
+        """
+        Initialise le filtre.
+
+        Args:
+            tags (list[str] | None): Tags acceptés (au moins un, sans tenir compte de la casse).
+            upload_date_min (str | None): Date de mise en ligne minimale (AAAAMMJJ ou AAAA-MM-JJ, incluse).
+            upload_date_max (str | None): Date de mise en ligne maximale (AAAAMMJJ ou AAAA-MM-JJ, incluse).
+            duration_min (int | None): Durée minimale en secondes (incluse).
+            duration_max (int | None): Durée maximale en secondes (incluse).
+        """
+        self.tags = tuple(sorted({tag.lower() for tag in tags})) if tags else None
+        self.upload_date_min = upload_date_min.replace("-", "") if upload_date_min else None
+        self.upload_date_max = upload_date_max.replace("-", "") if upload_date_max else None
+        self.duration_min = duration_min
+        self.duration_max = duration_max
+
+    def key(self) -> tuple:
+        """
+        Retourne une clé identifiant le filtre, pour le cache des sélecteurs.
+
+        Returns:
+            tuple: Conditions du filtre.
+        """
+        return (self.tags, self.upload_date_min, self.upload_date_max, self.duration_min, self.duration_max)
+
+    def to_sql(self) -> tuple[str, list]:
+        """
+        Traduit le filtre en une requête SQL retournant les identifiants des vidéos retenues.
+
+        Returns:
+            tuple[str, list]: Requête et paramètres.
+        """
+        conditions = []
+        params = []
+        if self.tags:
+            placeholders = ", ".join("?" for _ in self.tags)
+            conditions.append(f"id IN (SELECT video_id FROM tags WHERE LOWER(tag_name) IN ({placeholders}))")
+            params.extend(self.tags)
+        if self.upload_date_min:
+            conditions.append("upload_date >= ?")
+            params.append(self.upload_date_min)
+        if self.upload_date_max:
+            conditions.append("upload_date <= ?")
+            params.append(self.upload_date_max)
+        if self.duration_min is not None:
+            conditions.append("duration >= ?")
+            params.append(self.duration_min)
+        if self.duration_max is not None:
+            conditions.append("duration <= ?")
+            params.append(self.duration_max)
+
+        query = "SELECT id FROM videos"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query, params
+
+
+class MetadataFilterIndex:
+    """
+    Construit et met en cache les sélecteurs FAISS des filtres de métadonnées.
+
+    Un sélecteur contient les identifiants FAISS des chunks des vidéos retenues : la
+    recherche ne parcourt que ces chunks au lieu de filtrer les résultats a posteriori.
+    Une nouvelle instance est créée à chaque rechargement des index, ce qui invalide le cache.
+    """
+
+    def __init__(self, db_path: str, cache_size: int = SELECTOR_CACHE_SIZE):
+        """
+        Initialise l'index des filtres.
+
+        Args:
+            db_path (str): Chemin vers la base de données SQLite.
+            cache_size (int): Nombre de filtres dont le sélecteur est conservé.
+        """
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_chunk_ids(self, search_filter: SearchFilter) -> np.ndarray:
+        """
+        Retourne les identifiants des chunks des vidéos retenues par le filtre.
+
+        Args:
+            search_filter (SearchFilter): Filtre à appliquer.
+
+        Returns:
+            np.ndarray: Identifiants FAISS des chunks.
+        """
+        query, params = search_filter.to_sql()
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(f"SELECT id FROM chunks WHERE video_id IN ({query})", params).fetchall()
+        finally:
+            conn.close()
+        return np.array([row[0] for row in rows], dtype=np.int64)
+
+    def get_selector(self, search_filter: SearchFilter) -> faiss.IDSelector | None:
+        """
+        Retourne le sélecteur FAISS du filtre, en le construisant s'il n'est pas en cache.
+
+        Args:
+            search_filter (SearchFilter): Filtre à appliquer.
+
+        Returns:
+            faiss.IDSelector | None: Sélecteur des chunks retenus, ou None si aucun chunk n'est retenu.
+        """
+        key = search_filter.key()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        chunk_ids = self.get_chunk_ids(search_filter)
+        selector = faiss.IDSelectorBatch(chunk_ids) if len(chunk_ids) else None
+
+        with self._lock:
+            self._cache[key] = selector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return selector
+
+
+def get_search_parameters(index: faiss.Index, selector: faiss.IDSelector, nprobe: int, ef_search: int) -> faiss.SearchParameters:
+    """
+    Construit les paramètres d'une recherche filtrée, adaptés au type d'index.
+
+    Les paramètres sont modifiés par FAISS pendant la recherche (traduction des
+    identifiants de `IndexIDMap`) : ils doivent être construits pour chaque recherche.
+
+    Args:
+        index (faiss.Index): Index recherché.
+        selector (faiss.IDSelector): Sélecteur des identifiants autorisés.
+        nprobe (int): Nombre de listes visitées (index IVF).
+        ef_search (int): Largeur de la recherche (index HNSW).
+
+    Returns:
+        faiss.SearchParameters: Paramètres de recherche.
+    """
+    params = SEARCH_PARAMETERS_CLASSES[get_index_type(index)](sel=selector)
+    if isinstance(params, faiss.SearchParametersIVF):
+        params.nprobe = nprobe
+    elif isinstance(params, faiss.SearchParametersHNSW):
+        params.efSearch = ef_search
+    return params
+
+
+def search_index(
+    index: faiss.Index, queries: np.ndarray, k: int, params: faiss.SearchParameters | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Recherche les k plus proches voisins, avec les paramètres de `get_search_parameters`.
+
+    `IndexPQ` n'accepte pas de sélecteur : les vecteurs retenus sont alors décodés et
+    comparés exhaustivement aux requêtes, ce qui donne les mêmes distances que sa recherche.
+
+    Args:
+        index (faiss.Index): Index recherché.
+        queries (np.ndarray): Vecteurs de requête (une ligne par requête).
+        k (int): Nombre de voisins.
+        params (faiss.SearchParameters | None): Paramètres de recherche.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Distances et identifiants, comme `faiss.Index.search`.
+    """
+    if not isinstance(params, faiss.SearchParametersPQ) or params.sel is None:
+        return index.search(queries, k, params=params)
+
+    id_map = faiss.downcast_index(index)
+    ids = faiss.vector_to_array(id_map.id_map).astype(np.int64)
+    positions = np.array([position for position, faiss_id in enumerate(ids) if params.sel.is_member(int(faiss_id))], dtype=np.int64)
+
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    labels = np.full((len(queries), k), -1, dtype=np.int64)
+    if len(positions):
+        n_found = min(k, len(positions))
+        vectors = faiss.downcast_index(id_map.index).reconstruct_batch(positions)
+        distances[:, :n_found], found = faiss.knn(queries, vectors, n_found)
+        labels[:, :n_found] = ids[positions[found]]
+    return distances, labels
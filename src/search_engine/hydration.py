@@ -0,0 +1,142 @@
+"""
+Ce fichier contient la couche d'hydratation des résultats du moteur de recherche.
+"""
+
+import sqlite3
+import threading
+
+SQLITE_MAX_VARIABLES = 999
+
+
+class ResultHydrator:
+    """
+    Complète les résultats FAISS (chunk, vidéo, chapitre) avec les informations de la base.
+
+    Chaque thread conserve sa propre connexion SQLite en lecture seule : une
+    recherche ne coûte qu'une exécution de requête, sans ouverture de connexion.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialise la couche d'hydratation.
+
+        Args:
+            db_path (str): Chemin vers la base de données SQLite.
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Retourne la connexion en lecture seule du thread courant, en l'ouvrant si besoin.
+
+        Returns:
+            sqlite3.Connection: Connexion à la base de données.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _fetch(self, query: str, ids: list[int]) -> dict[int, tuple]:
+        """
+        Exécute une requête `IN` sur des identifiants, découpée au-delà de la limite de paramètres de SQLite.
+
+        Args:
+            query (str): Requête dont la première colonne est l'identifiant, avec `{placeholders}`.
+            ids (list[int]): Identifiants recherchés (les doublons sont ignorés).
+
+        Returns:
+            dict[int, tuple]: Colonnes restantes de chaque ligne, par identifiant.
+        """
+        ids = list(dict.fromkeys(ids))
+        rows = {}
+        for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            batch = ids[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ", ".join("?" for _ in batch)
+            for row in self._get_connection().execute(query.format(placeholders=placeholders), batch):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def fetch_chunks(self, chunk_ids: list[int]) -> dict[int, tuple]:
+        """
+        Récupère le texte et la position des chunks.
+
+        Args:
+            chunk_ids (list[int]): Identifiants des chunks.
+
+        Returns:
+            dict[int, tuple]: (texte, début, fin) de chaque chunk, par identifiant.
+        """
+        return self._fetch('''
+            SELECT id, chunks, start_seconds, end_seconds
+            FROM chunks
+            WHERE id IN ({placeholders})
+        ''', chunk_ids)
+
+    def fetch_videos(self, video_ids: list[int]) -> dict[int, tuple]:
+        """
+        Récupère l'identifiant YouTube et le titre des vidéos.
+
+        Args:
+            video_ids (list[int]): Identifiants des vidéos.
+
+        Returns:
+            dict[int, tuple]: (identifiant YouTube, titre) de chaque vidéo, par identifiant.
+        """
+        return self._fetch('''
+            SELECT id, youtube_id, title
+            FROM videos
+            WHERE id IN ({placeholders})
+        ''', video_ids)
+
+    def apply(self, hits: list[dict], chunk_rows: dict[int, tuple], video_rows: dict[int, tuple]) -> list[dict]:
+        """
+        Complète les résultats à partir des lignes déjà récupérées par `fetch_chunks`
+        et `fetch_videos`.
+
+        Args:
+            hits (list[dict]): Résultats contenant au moins `chunk_id` et `vid_id`.
+            chunk_rows (dict[int, tuple]): Lignes des chunks, par identifiant.
+            video_rows (dict[int, tuple]): Lignes des vidéos, par identifiant.
+
+        Returns:
+            list[dict]: Résultats complétés (les mêmes dictionnaires, modifiés en place).
+        """
+        for hit in hits:
+            hit["chunk_text"], hit["chunk_start"], hit["chunk_end"] = chunk_rows.get(hit["chunk_id"], (None,) * 3)
+            hit["youtube_id"], hit["title"] = video_rows.get(hit["vid_id"], (None,) * 2)
+        return hits
+
+    def hydrate(self, hits: list[dict]) -> list[dict]:
+        """
+        Ajoute à chaque résultat le texte du chunk, sa position dans la vidéo,
+        l'identifiant YouTube et le titre de la vidéo, en une seule requête.
+
+        Args:
+            hits (list[dict]): Résultats contenant au moins `chunk_id`.
+
+        Returns:
+            list[dict]: Résultats complétés (les mêmes dictionnaires, modifiés en place).
+        """
+        if not hits:
+            return hits
+
+        # Une seule requête, découpée uniquement au-delà de la limite de paramètres de SQLite
+        rows = self._fetch('''
+            SELECT c.id, c.chunks, c.start_seconds, c.end_seconds, v.youtube_id, v.title
+            FROM chunks c
+            JOIN videos v ON v.id = c.video_id
+            WHERE c.id IN ({placeholders})
+        ''', [hit["chunk_id"] for hit in hits])
+
+        for hit in hits:
+            chunk_text, chunk_start, chunk_end, youtube_id, title = rows.get(hit["chunk_id"], (None,) * 5)
+            hit["chunk_text"] = chunk_text
+            hit["chunk_start"] = chunk_start
+            hit["chunk_end"] = chunk_end
+            hit["youtube_id"] = youtube_id
+            hit["title"] = title
+
+        return hits
@@ -0,0 +1,374 @@
+"""
+Ce fichier contient la construction et le paramétrage des index FAISS.
+
+Types d'index disponibles :
+    - "flat" : recherche exhaustive exacte (IndexIDMap + IndexFlatL2) ;
+    - "ivf_flat" : partitionnement en listes inversées, vecteurs non compressés ;
+    - "ivf_pq" : partitionnement en listes inversées, vecteurs compressés par quantification produit ;
+    - "hnsw" : graphe de voisinage hiérarchique ;
+    - "sq8" / "sq_fp16" : recherche exhaustive sur des vecteurs compressés par quantification
+      scalaire (1 octet ou 2 octets par dimension au lieu de 4) ;
+    - "pq" : recherche exhaustive sur des vecteurs compressés par quantification produit
+      (PQ_SUBQUANTIZERS octets par vecteur).
+
+La quantification produit s'entraîne sur au moins 2^PQ_NBITS vecteurs : sur un petit
+corpus, le nombre de bits par sous-quantificateur est réduit (jusqu'à MIN_PQ_NBITS).
+
+Tant que le corpus est petit, l'index reste exhaustif ("flat"). Lorsque le nombre
+de vecteurs dépasse le seuil de promotion, l'index est reconstruit dans le type cible.
+"""
+
+import glob
+import math
+import os
+import time
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16", "pq")
+DEFAULT_INDEX_TYPE = "ivf_flat"
+DEFAULT_PROMOTION_THRESHOLD = 20000
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+
+PQ_SUBQUANTIZERS = 64
+PQ_NBITS = 8  # Bits par sous-quantificateur (256 centroïdes)
+MIN_PQ_NBITS = 4  # En dessous, la compression n'est plus utile : l'index n'est pas construit
+HNSW_NEIGHBORS = 32
+
+
+def get_index_settings(
+    index_type: str | None = None,
+    promotion_threshold: int | None = None,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+    ondisk: bool | None = None,
+) -> dict:
+    """
+    Complète les paramètres d'index avec les variables d'environnement ou les valeurs par défaut.
+
+    Variables d'environnement : FAISS_INDEX_TYPE, FAISS_PROMOTION_THRESHOLD,
+    FAISS_NPROBE, FAISS_EF_SEARCH et FAISS_ONDISK.
+
+    Args:
+        index_type (str | None): Type d'index cible.
+        promotion_threshold (int | None): Nombre de vecteurs déclenchant la promotion.
+        nprobe (int | None): Nombre de listes inversées parcourues (IVF).
+        ef_search (int | None): Taille de la file de recherche (HNSW).
+        ondisk (bool | None): Enregistre les listes inversées des index IVF sur disque.
+
+    Returns:
+        dict: Paramètres complets.
+    """
+    settings = {
+        "index_type": index_type or os.getenv("FAISS_INDEX_TYPE", DEFAULT_INDEX_TYPE),
+        "promotion_threshold": promotion_threshold or int(
+            os.getenv("FAISS_PROMOTION_THRESHOLD", DEFAULT_PROMOTION_THRESHOLD)
+        ),
+        "nprobe": nprobe or int(os.getenv("FAISS_NPROBE", DEFAULT_NPROBE)),
+        "ef_search": ef_search or int(os.getenv("FAISS_EF_SEARCH", DEFAULT_EF_SEARCH)),
+        "ondisk": ondisk if ondisk is not None else os.getenv("FAISS_ONDISK", "0") == "1",
+    }
+    if settings["index_type"] not in INDEX_TYPES:
+        raise ValueError(f"Type d'index inconnu : {settings['index_type']}")
+    return settings
+
+
+def get_index_type(index: faiss.Index) -> str:
+    """
+    Retourne le type d'un index FAISS existant.
+
+    Args:
+        index (faiss.Index): Index FAISS.
+
+    Returns:
+        str: Type de l'index (voir INDEX_TYPES).
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+
+    # Une variable par niveau : réaffecter `index` libérerait l'objet passé en argument
+    # s'il n'est référencé nulle part ailleurs (voir `get_vectors_and_ids`)
+    id_map = faiss.downcast_index(index)
+    inner = faiss.downcast_index(id_map.index) if isinstance(id_map, (faiss.IndexIDMap, faiss.IndexIDMap2)) else id_map
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "sq_fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(inner, faiss.IndexPQ):
+        return "pq"
+    return "flat"
+
+
+def get_pq_nbits(n_vectors: int) -> int:
+    """
+    Retourne le nombre de bits par sous-quantificateur entraînable sur `n_vectors` vecteurs.
+
+    Args:
+        n_vectors (int): Nombre de vecteurs d'entraînement.
+
+    Returns:
+        int: Nombre de bits (au plus PQ_NBITS, 2^nbits <= n_vectors).
+    """
+    return min(PQ_NBITS, int(math.log2(n_vectors))) if n_vectors > 0 else 0
+
+
+def get_training_minimum(index_type: str) -> int:
+    """
+    Retourne le nombre minimal de vecteurs pour construire un index du type donné.
+
+    Args:
+        index_type (str): Type d'index (voir INDEX_TYPES).
+
+    Returns:
+        int: Nombre minimal de vecteurs.
+    """
+    if index_type in ("pq", "ivf_pq"):
+        return 2 ** MIN_PQ_NBITS
+    return 1
+
+
+def can_train(index_type: str, n_vectors: int) -> bool:
+    """
+    Indique si un index du type donné peut être construit sur `n_vectors` vecteurs.
+
+    Args:
+        index_type (str): Type d'index (voir INDEX_TYPES).
+        n_vectors (int): Nombre de vecteurs disponibles.
+
+    Returns:
+        bool: True si l'index peut être entraîné.
+    """
+    return n_vectors >= get_training_minimum(index_type)
+
+
+def create_index(index_type: str, dim: int, n_vectors: int) -> faiss.Index:
+    """
+    Crée un index vide acceptant des identifiants personnalisés.
+
+    Args:
+        index_type (str): Type d'index (voir INDEX_TYPES).
+        dim (int): Dimension des vecteurs.
+        n_vectors (int): Nombre de vecteurs prévu, utilisé pour dimensionner l'IVF.
+
+    Returns:
+        faiss.Index: Index vide (à entraîner pour les index IVF).
+    """
+    # Règle usuelle : ~4 * sqrt(n) listes, avec au moins 39 vecteurs d'entraînement par liste
+    nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+    pq_nbits = get_pq_nbits(n_vectors)
+
+    if index_type == "flat":
+        description = "IDMap,Flat"
+    elif index_type == "ivf_flat":
+        description = f"IVF{nlist},Flat"
+    elif index_type == "ivf_pq":
+        description = f"IVF{nlist},PQ{PQ_SUBQUANTIZERS}x{pq_nbits}"
+    elif index_type == "hnsw":
+        description = f"IDMap2,HNSW{HNSW_NEIGHBORS}"
+    elif index_type == "sq8":
+        description = "IDMap2,SQ8"
+    elif index_type == "sq_fp16":
+        description = "IDMap2,SQfp16"
+    elif index_type == "pq":
+        description = f"IDMap2,PQ{PQ_SUBQUANTIZERS}x{pq_nbits}"
+    else:
+        raise ValueError(f"Type d'index inconnu : {index_type}")
+
+    return faiss.index_factory(dim, description, faiss.METRIC_L2)
+
+
+def get_vectors_and_ids(index: faiss.Index) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extrait les vecteurs (reconstruits) et les identifiants d'un index.
+
+    Args:
+        index (faiss.Index): Index FAISS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Vecteurs (float32) et identifiants (int64).
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        invlists = ivf.invlists
+        ids = np.concatenate([
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(ivf.nlist)
+        ] + [np.empty(0, dtype=np.int64)])
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        vectors = index.reconstruct_batch(ids) if len(ids) else np.empty((0, index.d), np.float32)
+        return vectors, ids
+
+    # Nouveau nom : réaffecter `index` libérerait l'objet passé en argument s'il
+    # n'est référencé nulle part ailleurs, alors que la conversion ne le possède pas
+    id_map = faiss.downcast_index(index)
+    ids = faiss.vector_to_array(id_map.id_map).astype(np.int64)
+    vectors = faiss.downcast_index(id_map.index).reconstruct_n(0, id_map.ntotal)
+    return vectors, ids
+
+
+def build_index(index_type: str, vectors: np.ndarray, ids: np.ndarray) -> faiss.Index:
+    """
+    Construit (et entraîne si nécessaire) un index contenant les vecteurs donnés.
+
+    Args:
+        index_type (str): Type d'index (voir INDEX_TYPES).
+        vectors (np.ndarray): Vecteurs à indexer.
+        ids (np.ndarray): Identifiants FAISS des vecteurs.
+
+    Returns:
+        faiss.Index: Index construit.
+
+    Raises:
+        ValueError: Si le nombre de vecteurs est insuffisant pour entraîner l'index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if not can_train(index_type, len(vectors)):
+        raise ValueError(
+            f"L'index '{index_type}' nécessite au moins {get_training_minimum(index_type)} vecteurs "
+            f"({len(vectors)} disponibles)."
+        )
+    index = create_index(index_type, vectors.shape[1], len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    return index
+
+
+def rebuild_index(index: faiss.Index, index_type: str) -> faiss.Index:
+    """
+    Reconstruit un index existant dans un autre type, en conservant les identifiants.
+
+    Args:
+        index (faiss.Index): Index à reconstruire.
+        index_type (str): Type d'index cible.
+
+    Returns:
+        faiss.Index: Nouvel index.
+    """
+    vectors, ids = get_vectors_and_ids(index)
+    return build_index(index_type, vectors, ids)
+
+
+def maybe_promote(index: faiss.Index, index_type: str, promotion_threshold: int) -> faiss.Index:
+    """
+    Reconstruit l'index exhaustif dans le type cible lorsque le corpus dépasse le seuil.
+    Pour compresser un index quelle que soit sa taille, utiliser `rebuild_index`.
+
+    Args:
+        index (faiss.Index): Index courant.
+        index_type (str): Type d'index cible.
+        promotion_threshold (int): Nombre de vecteurs déclenchant la promotion.
+
+    Returns:
+        faiss.Index: Index promu, ou l'index courant si aucune promotion n'est nécessaire.
+    """
+    if index_type == "flat" or index.ntotal < promotion_threshold:
+        return index
+    if get_index_type(index) != "flat":
+        return index
+
+    print(f"Promotion de l'index ({index.ntotal} vecteurs) vers le type '{index_type}'.")
+    return rebuild_index(index, index_type)
+
+
+def set_search_parameters(index: faiss.Index, nprobe: int, ef_search: int):
+    """
+    Applique les paramètres de recherche adaptés au type de l'index.
+
+    Args:
+        index (faiss.Index): Index FAISS.
+        nprobe (int): Nombre de listes inversées parcourues (IVF).
+        ef_search (int): Taille de la file de recherche (HNSW).
+    """
+    index_type = get_index_type(index)
+    parameters = faiss.ParameterSpace()
+    if index_type in ("ivf_flat", "ivf_pq"):
+        parameters.set_index_parameter(index, "nprobe", nprobe)
+    elif index_type == "hnsw":
+        parameters.set_index_parameter(index, "efSearch", ef_search)
+
+
+def load_index(path: str, mmap: bool = True) -> faiss.Index:
+    """
+    Charge un index FAISS depuis le disque.
+
+    En mode `mmap`, l'index est ouvert en lecture seule et ses vecteurs sont projetés
+    en mémoire au lieu d'être copiés : le démarrage est quasi instantané et plusieurs
+    processus d'une même machine partagent les mêmes pages du cache système. Les index
+    IVF enregistrés au format sur disque (`save_index(..., ondisk=True)`) sont toujours
+    projetés en mémoire. Si le format ne le permet pas, l'index est lu normalement.
+
+    Sans `mmap`, l'index est entièrement chargé en mémoire privée et peut être modifié.
+
+    Args:
+        path (str): Chemin de l'index.
+        mmap (bool): Ouvre l'index en lecture seule projetée en mémoire.
+
+    Returns:
+        faiss.Index: Index chargé.
+    """
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            print(f"Projection en mémoire impossible pour {path}, lecture complète de l'index.")
+        return faiss.read_index(path, faiss.IO_FLAG_READ_ONLY)
+
+    index = faiss.read_index(path)
+
+    # Ramène les listes inversées sur disque en mémoire pour ne pas modifier le fichier partagé
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists):
+        invlists = faiss.ArrayInvertedLists(ivf.nlist, ivf.code_size)
+        for list_no in range(ivf.nlist):
+            list_size = ivf.invlists.list_size(list_no)
+            if list_size:
+                invlists.add_entries(
+                    list_no, list_size, ivf.invlists.get_ids(list_no), ivf.invlists.get_codes(list_no)
+                )
+        ivf.replace_invlists(invlists, True)
+        invlists.this.disown()
+    return index
+
+
+def save_index(index: faiss.Index, path: str, ondisk: bool = False):
+    """
+    Enregistre un index FAISS de façon atomique.
+
+    L'index est écrit dans un fichier temporaire puis renommé : les processus qui
+    projettent l'ancienne version en mémoire continuent de la lire sans risque.
+    Avec `ondisk`, les listes inversées d'un index IVF sont écrites dans un fichier
+    `.ivfdata` séparé, projeté en mémoire au chargement.
+
+    Args:
+        index (faiss.Index): Index à enregistrer.
+        path (str): Chemin de l'index.
+        ondisk (bool): Utilise le format sur disque pour les index IVF.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    previous_data_files = glob.glob(f"{glob.escape(path)}.*.ivfdata")
+
+    if ondisk and ivf is not None:
+        # Copie de l'index pour laisser l'index en mémoire modifiable
+        index = faiss.clone_index(index)
+        ivf = faiss.extract_index_ivf(index)
+        data_path = f"{path}.{time.time_ns()}.ivfdata"
+        invlists = faiss.OnDiskInvertedLists(ivf.nlist, ivf.code_size, data_path)
+        sources = faiss.InvertedListsPtrVector()
+        sources.push_back(ivf.invlists)
+        invlists.merge_from_multiple(sources.data(), sources.size())
+        ivf.replace_invlists(invlists, True)
+        invlists.this.disown()
+    else:
+        data_path = None
+
+    temporary_path = f"{path}.tmp"
+    faiss.write_index(index, temporary_path)
+    os.replace(temporary_path, path)
+
+    # Les anciennes données restent lisibles par les processus qui les projettent déjà
+    for previous_data_file in previous_data_files:
+        if previous_data_file != data_path:
+            os.remove(previous_data_file)
@@ -0,0 +1,156 @@
+"""
+Ce fichier contient le rapport rappel / mémoire des différents types d'index FAISS.
+
+Utilisation :
+    python -m src.search_engine.index_report --index indexs/faiss_index_transcripts.bin --types sq8 sq_fp16 pq
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import faiss
+
+from src.search_engine.index_factory import INDEX_TYPES, build_index, can_train, get_training_minimum, get_vectors_and_ids
+from src.search_engine.filters import get_search_parameters, search_index
+
+
+def get_index_memory(index: faiss.Index) -> int:
+    """
+    Retourne la taille sérialisée d'un index, proche de sa mémoire résidente.
+
+    Args:
+        index (faiss.Index): Index FAISS.
+
+    Returns:
+        int: Taille en octets.
+    """
+    return faiss.serialize_index(index).size
+
+
+def compare_indexes(exact_index: faiss.Index, index: faiss.Index, queries: np.ndarray, k: int = 10) -> dict:
+    """
+    Compare un index au résultat exact : rappel@k, mémoire et latence moyenne.
+
+    Args:
+        exact_index (faiss.Index): Index exhaustif de référence.
+        index (faiss.Index): Index à évaluer.
+        queries (np.ndarray): Vecteurs de requête.
+        k (int): Nombre de voisins comparés.
+
+    Returns:
+        dict: Rappel@k, mémoire totale, octets par vecteur et latence moyenne par requête.
+    """
+    _, expected = exact_index.search(queries, k)
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+
+    recall = np.mean([
+        len(set(expected_row[expected_row >= 0]) & set(found_row)) / max((expected_row >= 0).sum(), 1)
+        for expected_row, found_row in zip(expected, found)
+    ])
+    memory = get_index_memory(index)
+
+    return {
+        f"recall@{k}": float(recall),
+        "memory_bytes": memory,
+        "bytes_per_vector": memory / max(index.ntotal, 1),
+        "latency_ms": elapsed * 1000 / len(queries),
+    }
+
+
+def check_filtered_search(index: faiss.Index, queries: np.ndarray, ids: np.ndarray, k: int = 10) -> bool:
+    """
+    Vérifie qu'une recherche filtrée (voir `filters.get_search_parameters`) est acceptée
+    par l'index et ne retourne que des identifiants autorisés.
+
+    Args:
+        index (faiss.Index): Index à vérifier.
+        queries (np.ndarray): Vecteurs de requête.
+        ids (np.ndarray): Identifiants de l'index (un sur deux est autorisé).
+        k (int): Nombre de voisins.
+
+    Returns:
+        bool: True si la recherche filtrée fonctionne.
+    """
+    allowed = ids[::2]
+    params = get_search_parameters(index, faiss.IDSelectorBatch(allowed), nprobe=16, ef_search=64)
+    try:
+        _, found = search_index(index, queries, k, params)
+    except RuntimeError:
+        return False
+    return bool(np.isin(found[found >= 0], allowed).all())
+
+
+def build_report(index: faiss.Index, index_types: list[str], n_queries: int = 100, k: int = 10) -> dict:
+    """
+    Construit chaque type d'index demandé à partir des vecteurs d'un index existant
+    et le compare à l'index exact.
+
+    Les requêtes sont des vecteurs de l'index légèrement bruités. Chaque index est aussi
+    vérifié en recherche filtrée. Les types qui ne peuvent pas être entraînés sur le
+    nombre de vecteurs disponibles sont signalés comme ignorés.
+
+    Args:
+        index (faiss.Index): Index source.
+        index_types (list[str]): Types d'index à évaluer.
+        n_queries (int): Nombre de requêtes.
+        k (int): Nombre de voisins comparés.
+
+    Returns:
+        dict: Résultats par type d'index, dont la validité de la recherche filtrée
+            (ou raison de l'exclusion, clé "skipped").
+    """
+    vectors, ids = get_vectors_and_ids(index)
+    exact_index = build_index("flat", vectors, ids)
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    noise = rng.normal(scale=vectors.std() * 0.1, size=(len(sample), vectors.shape[1]))
+    queries = (vectors[sample] + noise).astype(np.float32)
+
+    report = {"flat": {
+        **compare_indexes(exact_index, exact_index, queries, k),
+        "filtered_search": check_filtered_search(exact_index, queries, ids, k),
+    }}
+    for index_type in index_types:
+        if not can_train(index_type, len(vectors)):
+            report[index_type] = {
+                "skipped": f"au moins {get_training_minimum(index_type)} vecteurs nécessaires ({len(vectors)} disponibles)"
+            }
+            continue
+        index = build_index(index_type, vectors, ids)
+        report[index_type] = {
+            **compare_indexes(exact_index, index, queries, k),
+            "filtered_search": check_filtered_search(index, queries, ids, k),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rapport rappel / mémoire des types d'index FAISS.")
+    parser.add_argument("--index", default="indexs/faiss_index_transcripts.bin", help="Index source")
+    parser.add_argument("--types", nargs="+", default=["sq8", "sq_fp16", "pq"], choices=INDEX_TYPES,
+                        help="Types d'index évalués (tous : --types " + " ".join(INDEX_TYPES) + ")")
+    parser.add_argument("--queries", type=int, default=100, help="Nombre de requêtes")
+    parser.add_argument("--k", type=int, default=10, help="Nombre de voisins comparés")
+    parser.add_argument("--json", action="store_true", help="Affiche le rapport au format JSON")
+    args = parser.parse_args()
+
+    results = build_report(faiss.read_index(args.index), args.types, args.queries, args.k)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'Type':<10} {'Rappel@' + str(args.k):>10} {'Mémoire (Ko)':>14} {'Octets/vecteur':>16} {'Latence (ms)':>14} {'Filtre':>8}")
+        for index_type, result in results.items():
+            if "skipped" in result:
+                print(f"{index_type:<10} ignoré : {result['skipped']}")
+                continue
+            print(
+                f"{index_type:<10} {result[f'recall@{args.k}']:>10.3f} {result['memory_bytes'] / 1024:>14.1f} "
+                f"{result['bytes_per_vector']:>16.1f} {result['latency_ms']:>14.3f} "
+                f"{'ok' if result['filtered_search'] else 'ÉCHEC':>8}"
+            )
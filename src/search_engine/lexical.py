@@ -0,0 +1,123 @@
+"""
+Ce fichier contient la recherche lexicale (BM25) sur l'index plein texte des chunks.
+"""
+
+import re
+import sqlite3
+import threading
+
+from src.search_engine.faiss_ids import decode_id
+from src.search_engine.filters import SearchFilter
+
+# Termes de la requête : mots simples ou composés (k-means, t-SNE, ...)
+TERM_PATTERN = r"\w+(?:[-'.]\w+)*"
+
+# Mots outils ignorés pour juger si une requête est une recherche par mots-clés
+STOPWORDS = frozenset("""
+    a à au aux avec c ce ces cet cette comment d dans de des du elle en est est-ce et être eux
+    il ils j je l la le les leur lui m ma mais me même mes moi mon n ne ni nos notre nous
+    on ou où par pas pour qu que quel quelle quelles quels qui quoi s sa sans se ses si
+    son sont sur t ta te tes toi ton tu un une vos votre vous y
+""".split())
+
+
+class LexicalSearcher:
+    """
+    Recherche les chunks contenant les termes de la requête grâce à l'index FTS5 `chunks_fts`.
+
+    La recherche est entièrement locale et ne nécessite aucun appel à l'API d'embedding.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialise la recherche lexicale.
+
+        Args:
+            db_path (str): Chemin vers la base de données SQLite.
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Retourne la connexion en lecture seule du thread courant, en l'ouvrant si besoin.
+
+        Returns:
+            sqlite3.Connection: Connexion à la base de données.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def get_terms(self, prompt: str) -> list[str]:
+        """
+        Extrait les termes d'une requête.
+
+        Args:
+            prompt (str): Requête de l'utilisateur.
+
+        Returns:
+            list[str]: Termes en minuscules, sans doublons.
+        """
+        return list(dict.fromkeys(re.findall(TERM_PATTERN, prompt.lower())))
+
+    def get_keywords(self, prompt: str) -> list[str]:
+        """
+        Extrait les termes significatifs d'une requête, sans les mots outils.
+
+        Les élisions (« c'est », « l'ACP ») sont jugées sur le mot qui suit l'apostrophe.
+
+        Args:
+            prompt (str): Requête de l'utilisateur.
+
+        Returns:
+            list[str]: Termes en minuscules, sans doublons ni mots outils.
+        """
+        return [term for term in self.get_terms(prompt) if term.split("'")[-1] not in STOPWORDS]
+
+    def search(self, prompt: str, k: int = 5, search_filter: SearchFilter | None = None) -> list[dict]:
+        """
+        Retourne les k chunks les plus pertinents au sens de BM25.
+
+        Chaque terme est recherché comme une phrase (les termes composés restent
+        groupés) et les termes sont combinés par OU.
+
+        Args:
+            prompt (str): Requête de l'utilisateur.
+            k (int): Nombre de résultats.
+            search_filter (SearchFilter | None): Filtre des vidéos recherchées.
+
+        Returns:
+            list[dict]: Résultats triés (`chunk_id`, `vid_id`, `score` BM25, plus faible = meilleur).
+        """
+        terms = self.get_terms(prompt)
+        if not terms:
+            return []
+
+        query = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        condition, params = "", []
+        if search_filter is not None:
+            filter_query, params = search_filter.to_sql()
+            condition = f"AND rowid IN (SELECT id FROM chunks WHERE video_id IN ({filter_query}))"
+        try:
+            rows = self._get_connection().execute(f'''
+                SELECT rowid, bm25(chunks_fts) AS rank
+                FROM chunks_fts
+                WHERE chunks_fts MATCH ? {condition}
+                ORDER BY rank
+                LIMIT ?
+            ''', (query, *params, k)).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"Recherche lexicale impossible : {e}")
+            return []
+
+        return [
+            {
+                "chunk_id": chunk_id,
+                "vid_id": decode_id(chunk_id)[0],
+                "score": score
+            }
+            for chunk_id, score in rows
+        ]
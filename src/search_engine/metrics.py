@@ -0,0 +1,274 @@
+"""
+Ce fichier contient la mesure des latences du moteur de recherche, étape par étape.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+STAGES = ("embed", "search", "chapters", "hydrate")
+# Bornes des classes de l'histogramme, en secondes (convention Prometheus)
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PERCENTILE_WINDOW = 1024  # Nombre de mesures récentes conservées pour les percentiles
+PROMETHEUS_PATH = "cache/search_metrics.prom"
+
+
+class LatencyHistogram:
+    """
+    Histogramme cumulatif des latences d'une étape.
+
+    Les percentiles sont calculés exactement sur les `PERCENTILE_WINDOW` dernières mesures.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = HISTOGRAM_BUCKETS, window: int = PERCENTILE_WINDOW):
+        """
+        Initialise l'histogramme.
+
+        Args:
+            buckets (tuple[float, ...]): Bornes supérieures des classes, en secondes.
+            window (int): Nombre de mesures récentes conservées pour les percentiles.
+        """
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """
+        Ajoute une mesure.
+
+        Args:
+            seconds (float): Durée mesurée, en secondes.
+        """
+        with self._lock:
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.bucket_counts[position] += 1
+            self.count += 1
+            self.total += seconds
+            self.recent.append(seconds)
+
+    def snapshot(self) -> tuple[list[int], int, float]:
+        """
+        Retourne une copie cohérente des compteurs.
+
+        Returns:
+            tuple[list[int], int, float]: Effectifs cumulés des classes, nombre de mesures et durée totale.
+        """
+        with self._lock:
+            return list(self.bucket_counts), self.count, self.total
+
+    def summary(self) -> dict:
+        """
+        Résume les mesures.
+
+        Returns:
+            dict: Nombre de mesures, moyenne et percentiles p50 / p95 / p99, en millisecondes.
+        """
+        with self._lock:
+            recent = np.array(self.recent)
+            count, total = self.count, self.total
+
+        if not count:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) * 1000
+        return {
+            "count": count,
+            "mean_ms": total * 1000 / count,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
+
+
+class MetricsSink:
+    """
+    Destination des mesures : reçoit les durées de chaque recherche.
+    """
+
+    def emit(self, timings: dict[str, float], recorder: "MetricsRecorder"):
+        """
+        Traite les durées d'une recherche.
+
+        Args:
+            timings (dict[str, float]): Durée de chaque étape, en secondes.
+            recorder (MetricsRecorder): Enregistreur, pour accéder aux histogrammes.
+        """
+        raise NotImplementedError
+
+
+class LogSink(MetricsSink):
+    """
+    Affiche une ligne par recherche avec la durée de chaque étape.
+    """
+
+    def emit(self, timings: dict[str, float], recorder: "MetricsRecorder"):
+        stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+        print(f"Recherche : {stages} total={sum(timings.values()) * 1000:.1f}ms")
+
+
+class PrometheusFileSink(MetricsSink):
+    """
+    Écrit les histogrammes au format texte Prometheus (collecteur `textfile` de node_exporter).
+    """
+
+    def __init__(self, path: str = PROMETHEUS_PATH, interval: float = 10.0):
+        """
+        Initialise la destination.
+
+        Args:
+            path (str): Chemin du fichier `.prom`.
+            interval (float): Délai minimal entre deux écritures, en secondes.
+        """
+        self.path = path
+        self.interval = interval
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def emit(self, timings: dict[str, float], recorder: "MetricsRecorder"):
+        with self._lock:
+            if time.monotonic() - self._last_write < self.interval:
+                return
+            self._last_write = time.monotonic()
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(recorder.to_prometheus())
+            os.replace(tmp_path, self.path)
+
+
+class RecentSearchesSink(MetricsSink):
+    """
+    Conserve les durées des dernières recherches, pour le panneau de débogage de l'application.
+    """
+
+    def __init__(self, maxlen: int = 20):
+        """
+        Initialise la destination.
+
+        Args:
+            maxlen (int): Nombre de recherches conservées.
+        """
+        self.searches = deque(maxlen=maxlen)
+
+    def emit(self, timings: dict[str, float], recorder: "MetricsRecorder"):
+        self.searches.append({stage: seconds * 1000 for stage, seconds in timings.items()})
+
+
+def get_metrics_sinks() -> list[MetricsSink]:
+    """
+    Construit les destinations des mesures à partir des variables d'environnement.
+
+    SEARCH_METRICS_SINKS liste les destinations séparées par des virgules (`log`,
+    `prometheus`, `debug`) ; SEARCH_METRICS_PROMETHEUS_PATH donne le fichier Prometheus.
+
+    Returns:
+        list[MetricsSink]: Destinations des mesures.
+    """
+    sinks = []
+    for name in filter(None, os.getenv("SEARCH_METRICS_SINKS", "").replace(" ", "").split(",")):
+        if name == "log":
+            sinks.append(LogSink())
+        elif name == "prometheus":
+            sinks.append(PrometheusFileSink(os.getenv("SEARCH_METRICS_PROMETHEUS_PATH", PROMETHEUS_PATH)))
+        elif name == "debug":
+            sinks.append(RecentSearchesSink())
+        else:
+            raise ValueError(f"Destination de mesures inconnue : {name}")
+    return sinks
+
+
+class MetricsRecorder:
+    """
+    Enregistre la durée de chaque étape des recherches dans des histogrammes en mémoire
+    et la transmet aux destinations configurées.
+    """
+
+    def __init__(self, sinks: list[MetricsSink] | None = None):
+        """
+        Initialise l'enregistreur.
+
+        Args:
+            sinks (list[MetricsSink] | None): Destinations des mesures (variables d'environnement par défaut).
+        """
+        self.sinks = get_metrics_sinks() if sinks is None else sinks
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+
+    @contextmanager
+    def time(self, stage: str, timings: dict[str, float]):
+        """
+        Mesure la durée du bloc et l'ajoute à celle de l'étape dans `timings`.
+
+        Args:
+            stage (str): Étape mesurée.
+            timings (dict[str, float]): Durées de la recherche en cours, en secondes.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    def record(self, timings: dict[str, float]):
+        """
+        Enregistre les durées d'une recherche et les transmet aux destinations.
+
+        Args:
+            timings (dict[str, float]): Durée de chaque étape, en secondes.
+        """
+        for stage, seconds in timings.items():
+            self.histograms[stage].observe(seconds)
+
+        for sink in self.sinks:
+            try:
+                sink.emit(timings, self)
+            except Exception as e:
+                print(f"Impossible de transmettre les mesures à {type(sink).__name__} : {e}")
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Résume les latences de chaque étape.
+
+        Returns:
+            dict[str, dict]: Nombre de mesures, moyenne et percentiles p50 / p95 / p99 (ms), par étape.
+        """
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def get_sink(self, sink_type: type) -> MetricsSink | None:
+        """
+        Retourne la première destination du type donné.
+
+        Args:
+            sink_type (type): Type de destination recherché.
+
+        Returns:
+            MetricsSink | None: Destination trouvée, ou None.
+        """
+        return next((sink for sink in self.sinks if isinstance(sink, sink_type)), None)
+
+    def to_prometheus(self) -> str:
+        """
+        Exporte les histogrammes au format texte Prometheus.
+
+        Returns:
+            str: Histogramme `search_stage_latency_seconds`, une série par étape.
+        """
+        lines = [
+            "# HELP search_stage_latency_seconds Durée des étapes de la recherche.",
+            "# TYPE search_stage_latency_seconds histogram",
+        ]
+        for stage, histogram in self.histograms.items():
+            bucket_counts, count, total = histogram.snapshot()
+            for bound, bucket_count in zip(histogram.buckets, bucket_counts):
+                lines.append(f'search_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+            lines.append(f'search_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'search_stage_latency_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'search_stage_latency_seconds_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
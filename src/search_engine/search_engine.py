@@ -1,146 +1,369 @@
+import asyncio
 import numpy as np
-import faiss
-import sqlite3
-import re
+import threading
 
 from src.llm.llm import LLM
+from src.llm.embeddings import EmbeddingBackend
+from src.db.db_youtube import YouTubeManager
+from src.search_engine.faiss_ids import decode_ids
+from src.search_engine.hydration import ResultHydrator
+from src.search_engine.chapters import ChapterIntervalIndex
+from src.search_engine.lexical import LexicalSearcher
+from src.search_engine.batcher import SearchBatcher
+from src.search_engine.metrics import MetricsRecorder
+from src.search_engine.filters import MetadataFilterIndex, SearchFilter, get_search_parameters, search_index
+from src.search_engine.semantic_cache import SemanticCache
+from src.search_engine.index_factory import get_index_settings, load_index, set_search_parameters
+
+TRANSCRIPTS_INDEX_PATH = "indexs/faiss_index_transcripts.bin"
+DB_PATH = 'src/videos_youtube.db'
+
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+DEFAULT_SEARCH_MODE = "dense"
+RRF_K = 60  # Constante de lissage de la fusion RRF
+RRF_DEPTH = 20  # Nombre de candidats de chaque recherche utilisés pour la fusion
+KEYWORD_QUERY_MAX_TERMS = 2  # En dessous (hors mots outils), une requête trouvée en lexical n'est pas encodée
 
 
 class SearchEngine:
-    def __init__(self):
-        """Initialise le pipeline"""
-        self.llm = LLM()
-        self.index_transcriptions = faiss.read_index("indexs/faiss_index_transcripts.bin")
-        self.index_chapters = faiss.read_index("indexs/faiss_index_chapters.bin")
-        self.db_path = 'src/videos_youtube.db'
-
-    def search_similarity(self, prompt_embedding: list[float]):
-        """Recherche l'embedding le plus proche du prompt"""
-        #Recherche de similarité
-        _, results = self.index_transcriptions.search(np.array([prompt_embedding]), k=1)
-        
-        #Formatage des résultats 
-        if len(str(results[0][0])) == 5 :
-            chunk_id = "00" + str(results[0][0]) 
-            vid_id = str(results[0][0])[:1]
-        elif len(str(results[0][0])) == 6:
-            chunk_id = "0" + str(results[0][0]) 
-            vid_id = str(results[0][0])[:2]
-        else :
-            chunk_id = str(results[0][0]) 
-            vid_id = str(results[0][0])[:3]
-
-        return {
-            "prompt_embedding": prompt_embedding,
-            "chunk_id": chunk_id,
-            "vid_id": vid_id
-        }
-
-    def get_chunk_text(self, results_similarity: dict):
-        """Récupère le texte du chunk le plus proche"""
-        #Recupère l'url de la vidéo
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT chunks FROM chunks WHERE id = ?", (int(results_similarity["chunk_id"]),))
-        result = cursor.fetchone()
-        conn.close()
-
-        chunk_text = result[0]
-
-        return chunk_text
-
-
-    def search_similar_chapter(self, results_similarity: dict):
-        """Recherche le chapitre associé au chunk sélectionné"""
-        #Recherche de similarité
-        _, results = self.index_chapters.search(np.array([results_similarity["prompt_embedding"]], np.float32), k=1)
-
-        #Formatage des résultats 
-        if len(str(results[0][0])) == 4 :
-            chapter_id = str(results[0][0])[-4:]
-            vid_id = str(results[0][0])[:1]
-        elif len(str(results[0][0])) == 5 :
-            chapter_id = str(results[0][0])[-4:]
-            vid_id = str(results[0][0])[:2]
-        else :
-            chapter_id = str(results[0][0])[-4:]
-            vid_id = str(results[0][0])[:3]
-
-        if results_similarity["vid_id"] == vid_id : 
-            return {
-                "chapter_id" : chapter_id,
-                "vid_id" : vid_id
-            }
-
-        else :
-            return {
-                "chapter_id" : None,
-                "vid_id" : vid_id
-            }
-
-    def search_vid_url(self, id_vid, chapter_id):
-        """Retourne l'URL de la vidéo associée à un ID donné"""
-        #Recupère l'url de la vidéo
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT url FROM videos WHERE id = ?", (id_vid,))
-        result = cursor.fetchone()
-        conn.close()
-
-        video_url = result[0]
-
-        #Récupère l'ID Youtube de la vidéo 
-        match = re.search(r"(?<=v=)[\w-]+", video_url)
-        id_yt_vid = match.group(0)
-
-        if chapter_id is not None :
-            #Récupère le timestamp du chapitre
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT timestamp FROM video_chapters WHERE id = ?", (chapter_id,))
-            result = cursor.fetchone()
-            conn.close()
-
-            if result is None:
-                total_seconds = 0
+    def __init__(
+        self,
+        transcripts_index_path: str = TRANSCRIPTS_INDEX_PATH,
+        db_path: str = DB_PATH,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mmap: bool = True,
+        batching: bool = False,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        omp_threads: int | None = None,
+        metrics: MetricsRecorder | None = None,
+        semantic_cache: SemanticCache | None = None,
+        embedding_backend: EmbeddingBackend | None = None,
+    ):
+        """Initialise le pipeline.
+
+        `nprobe` (index IVF) et `ef_search` (index HNSW) règlent le compromis vitesse / rappel
+        des index approximatifs ; ils sont ignorés pour un index exhaustif. Avec `mmap`,
+        l'index est projeté en mémoire en lecture seule plutôt que copié. Avec `batching`,
+        les recherches FAISS concurrentes sont regroupées par un `SearchBatcher`. La durée
+        de chaque étape est enregistrée par `metrics` (destinations configurées par variables
+        d'environnement par défaut). Avec `semantic_cache`, une requête proche d'une requête
+        déjà servie reçoit le même résultat sans recherche ni hydratation. `embedding_backend`
+        doit être celui qui a servi à construire l'index (EMBEDDING_BACKEND par défaut).
+        """
+        self.mmap = mmap
+        self.llm = LLM(embedding_backend)
+        self.index_settings = get_index_settings(nprobe=nprobe, ef_search=ef_search)
+        self.transcripts_index_path = transcripts_index_path
+        self.db_path = db_path
+        YouTubeManager(db_path)  # Met à jour le schéma (youtube_id, positions des chapitres et chunks) si besoin
+        self.hydrator = ResultHydrator(db_path)
+        self.lexical_searcher = LexicalSearcher(db_path)
+        self.metrics = metrics or MetricsRecorder()
+        self.semantic_cache = semantic_cache
+        self.version = 0
+        self._reload_lock = threading.Lock()
+        self.load_indexes()
+        self.batcher = None
+        if batching:
+            self.batcher = SearchBatcher(lambda: self.index_transcriptions, max_batch_size, max_wait_ms, omp_threads)
+
+    def load_indexes(self):
+        """(Re)charge l'index FAISS, l'index des chapitres et vide les caches (filtres, résultats).
+
+        Les index sont remplacés par simple affectation : les recherches déjà lancées
+        dans d'autres sessions terminent sur l'ancienne version.
+        """
+        with self._reload_lock:
+            index_transcriptions = load_index(self.transcripts_index_path, self.mmap)
+            set_search_parameters(
+                index_transcriptions, self.index_settings["nprobe"], self.index_settings["ef_search"]
+            )
+            chapter_index = ChapterIntervalIndex(self.db_path)
+            self.index_transcriptions = index_transcriptions
+            self.chapter_index = chapter_index
+            self.filter_index = MetadataFilterIndex(self.db_path)
+            if self.semantic_cache is not None:
+                self.semantic_cache.clear()
+            self.version += 1
+
+    def get_filter_parameters(self, index, search_filter: SearchFilter):
+        """Retourne les paramètres FAISS limitant la recherche aux chunks retenus par le filtre (None si aucun)"""
+        selector = self.filter_index.get_selector(search_filter)
+        if selector is None:
+            return None
+        return get_search_parameters(index, selector, self.index_settings["nprobe"], self.index_settings["ef_search"])
+
+    def search_similarity(self, prompt_embedding: list[float], k: int = 1, search_filter: SearchFilter | None = None) -> list[dict]:
+        """Recherche les k chunks les plus proches du prompt, triés par distance croissante"""
+        return self.search_similarity_batch([prompt_embedding], k, search_filter)[0]
+
+    def search_similarity_batch(
+        self, prompt_embeddings: list[list[float]], k: int = 1, search_filter: SearchFilter | None = None
+    ) -> list[list[dict]]:
+        """Recherche les k chunks les plus proches de chaque prompt en une seule recherche matricielle.
+
+        Avec `search_filter`, seuls les chunks des vidéos retenues sont parcourus par FAISS.
+        """
+        queries = np.array(prompt_embeddings, np.float32)
+        index = self.index_transcriptions
+        params = None
+        if search_filter is not None:
+            params = self.get_filter_parameters(index, search_filter)
+            if params is None:
+                return [[] for _ in prompt_embeddings]
+
+        if self.batcher is not None:
+            #Recherche de similarité (regroupée avec celles des autres sessions, sauf si filtrée)
+            distances, results = self.batcher.search(queries, k, params)
+        else:
+            distances, results = search_index(index, queries, k, params)
+
+        return self.format_similarity_results(distances, results)
+
+    def format_similarity_results(self, distances: np.ndarray, results: np.ndarray) -> list[list[dict]]:
+        """Convertit le résultat d'une recherche FAISS en listes de résultats (chunk, vidéo, score)"""
+        vid_ids, _ = decode_ids(results)
+
+        return [
+            [
+                {
+                    "chunk_id": int(chunk_id),
+                    "vid_id": int(vid_id),
+                    "score": float(distance)
+                }
+                for chunk_id, vid_id, distance in zip(row_ids, row_vid_ids, row_distances)
+                if chunk_id >= 0
+            ]
+            for row_ids, row_vid_ids, row_distances in zip(results, vid_ids, distances)
+        ]
+
+    async def asearch_similarity(self, prompt_embedding: list[float], k: int = 1, search_filter: SearchFilter | None = None) -> list[dict]:
+        """Version asynchrone de `search_similarity` : la recherche FAISS s'exécute hors de la boucle d'événements"""
+        queries = np.array([prompt_embedding], np.float32)
+        index = self.index_transcriptions
+        loop = asyncio.get_running_loop()
+        params = None
+        if search_filter is not None:
+            params = await loop.run_in_executor(None, self.get_filter_parameters, index, search_filter)
+            if params is None:
+                return []
+
+        if self.batcher is not None:
+            distances, results = await asyncio.wrap_future(self.batcher.submit(queries, k, params))
+        else:
+            distances, results = await loop.run_in_executor(None, search_index, index, queries, k, params)
+        return self.format_similarity_results(distances, results)[0]
+
+    def is_keyword_query(self, prompt: str, lexical_hits: list[dict]) -> bool:
+        """Indique si une requête courte, trouvée en lexical, peut se passer de l'embedding."""
+        return bool(lexical_hits) and 0 < len(self.lexical_searcher.get_keywords(prompt)) <= KEYWORD_QUERY_MAX_TERMS
+
+    def resolve_chapters(self, hits: list[dict]) -> list[dict]:
+        """Associe à chaque résultat le chapitre contenant le milieu du chunk et l'URL intégrable"""
+        for hit in hits:
+            middle = None
+            if hit["chunk_start"] is not None and hit["chunk_end"] is not None:
+                middle = (hit["chunk_start"] + hit["chunk_end"]) // 2
+
+            chapter = self.chapter_index.lookup(hit["vid_id"], middle)
+            if chapter is not None:
+                hit["chapter_id"], start_seconds = chapter
+            else:
+                hit["chapter_id"], start_seconds = None, hit["chunk_start"] or 0
+
+            # Construction de l'URL avec le timestamp du chapitre (ou du chunk)
+            hit["video_url_with_timestamp"] = f"https://www.youtube.com/embed/{hit['youtube_id']}?start={start_seconds}"
+
+        return hits
+
+    def fuse_results(self, dense_hits: list[dict], lexical_hits: list[dict], k: int) -> list[dict]:
+        """Fusionne les résultats denses et lexicaux par Reciprocal Rank Fusion (RRF)"""
+        fused = {}
+        for hits in (dense_hits, lexical_hits):
+            for rank, hit in enumerate(hits, start=1):
+                fused_hit = fused.setdefault(hit["chunk_id"], {"chunk_id": hit["chunk_id"], "vid_id": hit["vid_id"], "score": 0.0})
+                fused_hit["score"] += 1 / (RRF_K + rank)
+
+        return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:k]
+
+    def search(
+        self, prompt: str, k: int = 5, mode: str = DEFAULT_SEARCH_MODE, search_filter: SearchFilter | None = None
+    ) -> list[dict]:
+        """Retourne les k meilleurs résultats (chunk, vidéo, chapitre, score) pour le prompt.
+
+        Modes de recherche :
+            - "dense" : similarité des embeddings, le score est la distance L2 (plus faible = meilleur) ;
+            - "lexical" : BM25 sur l'index plein texte, sans appel d'embedding (plus faible = meilleur) ;
+            - "hybrid" : fusion RRF des deux (plus élevé = meilleur). Une requête de quelques
+              mots-clés trouvés dans l'index plein texte est servie en lexical seul.
+
+        `search_filter` restreint la recherche aux vidéos retenues (tags, date, durée),
+        à l'intérieur des recherches FAISS et plein texte.
+        """
+        return self.search_batch([prompt], k, mode, search_filter)[0]
+
+    def search_batch(
+        self, prompts: list[str], k: int = 5, mode: str = DEFAULT_SEARCH_MODE, search_filter: SearchFilter | None = None
+    ) -> list[list[dict]]:
+        """Retourne les k meilleurs résultats de chaque prompt (voir `search`).
+
+        Tous les prompts sont encodés en une seule requête d'embedding, recherchés en une
+        seule recherche FAISS matricielle, puis hydratés ensemble.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche inconnu : {mode}")
+
+        results = [[] for _ in prompts]
+        lexical_results = [[] for _ in prompts]
+        to_embed = []
+        to_search = []
+        cached_positions = set()
+        timings = {}
+        context = (mode, k, search_filter.key() if search_filter is not None else None)
+
+        # Étape 1: Recherche lexicale (locale)
+        for position, prompt in enumerate(prompts):
+            prompt_mode = mode
+            if mode in ("lexical", "hybrid"):
+                with self.metrics.time("search", timings):
+                    lexical_results[position] = self.lexical_searcher.search(prompt, k if mode == "lexical" else RRF_DEPTH, search_filter)
+                if mode == "hybrid" and self.is_keyword_query(prompt, lexical_results[position]):
+                    prompt_mode = "lexical"
+
+            if prompt_mode == "lexical":
+                results[position] = lexical_results[position][:k]
             else:
-                chapter_timestamp = result[0]
-                # Convertit le timestamp MM:SS en secondes
-                minutes, seconds = map(int, chapter_timestamp.split(':'))
-                total_seconds = minutes * 60 + seconds
+                to_embed.append(position)
+
+        if to_embed:
+            # Étape 2: Générer les embeddings des prompts
+            with self.metrics.time("embed", timings):
+                prompt_embeddings = self.llm.generate_prompts_embeddings([prompts[position] for position in to_embed])
+
+            # Résultats déjà servis pour des requêtes similaires
+            to_search = list(zip(to_embed, prompt_embeddings))
+            if self.semantic_cache is not None:
+                for position, embedding in to_search:
+                    cached_hits = self.semantic_cache.get(embedding, context)
+                    if cached_hits is not None:
+                        results[position] = cached_hits
+                        cached_positions.add(position)
+                to_search = [(position, embedding) for position, embedding in to_search if position not in cached_positions]
+
+            # Étape 3: Recherche des chunks les plus similaires
+            if to_search:
+                with self.metrics.time("search", timings):
+                    dense_results = self.search_similarity_batch(
+                        [embedding for _, embedding in to_search], k if mode == "dense" else max(k, RRF_DEPTH), search_filter
+                    )
+                for (position, _), dense_hits in zip(to_search, dense_results):
+                    if mode == "dense":
+                        results[position] = dense_hits
+                    else:
+                        results[position] = self.fuse_results(dense_hits, lexical_results[position], k)
+
+        all_hits = [hit for position, hits in enumerate(results) if position not in cached_positions for hit in hits]
+
+        # Étape 4: Récupère le texte et la position des chunks ainsi que les vidéos
+        with self.metrics.time("hydrate", timings):
+            self.hydrator.hydrate(all_hits)
+
+        # Étape 5: Retrouve le chapitre de chaque chunk et l'URL avec le timestamp
+        with self.metrics.time("chapters", timings):
+            self.resolve_chapters(all_hits)
+
+        if self.semantic_cache is not None:
+            for position, embedding in to_search:
+                self.semantic_cache.put(embedding, context, results[position])
+
+        self.metrics.record(timings)
+        return results
+
+    def get_full_search_results(self, prompt: str, mode: str = DEFAULT_SEARCH_MODE, search_filter: SearchFilter | None = None):
+        """Centralise et retourne le meilleur résultat sous forme de dictionnaire (None si aucun résultat)"""
+        hits = self.search(prompt, k=1, mode=mode, search_filter=search_filter)
+        return hits[0] if hits else None
+
+    def get_full_search_results_batch(
+        self, prompts: list[str], mode: str = DEFAULT_SEARCH_MODE, search_filter: SearchFilter | None = None
+    ) -> list[dict | None]:
+        """Retourne le meilleur résultat de chaque prompt (None si aucun résultat)"""
+        return [hits[0] if hits else None for hits in self.search_batch(prompts, k=1, mode=mode, search_filter=search_filter)]
+
+    async def asearch(
+        self, prompt: str, k: int = 5, mode: str = DEFAULT_SEARCH_MODE, search_filter: SearchFilter | None = None
+    ) -> list[dict]:
+        """Version asynchrone de `search`, pour servir de nombreuses recherches depuis une seule boucle d'événements.
+
+        L'embedding est demandé de façon asynchrone, la recherche FAISS et les requêtes SQLite
+        s'exécutent dans des threads. Les vidéos des meilleurs candidats lexicaux sont préchargées
+        pendant le calcul de l'embedding, puis les chunks et les vidéos restantes sont récupérés
+        en parallèle.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche inconnu : {mode}")
+
+        timings = {}
+        context = (mode, k, search_filter.key() if search_filter is not None else None)
+        prompt_embedding = None
 
-            # Construction de l'URL avec le timestamp
-            video_url_with_timestamp = f"https://www.youtube.com/embed/{id_yt_vid}?start={total_seconds}"
+        # Étape 1: Recherche lexicale (locale)
+        lexical_hits = []
+        if mode in ("lexical", "hybrid"):
+            with self.metrics.time("search", timings):
+                lexical_hits = await asyncio.to_thread(self.lexical_searcher.search, prompt, k if mode == "lexical" else RRF_DEPTH, search_filter)
 
-            return video_url_with_timestamp
+        # Préchargement spéculatif des vidéos des meilleurs candidats lexicaux
+        prefetched_ids = list(dict.fromkeys(hit["vid_id"] for hit in lexical_hits[:k]))
+        prefetch = asyncio.create_task(asyncio.to_thread(self.hydrator.fetch_videos, prefetched_ids))
 
+        if mode == "lexical" or (mode == "hybrid" and self.is_keyword_query(prompt, lexical_hits)):
+            hits = lexical_hits[:k]
         else:
-            return f"https://www.youtube.com/embed/{id_yt_vid}?start=0"
+            # Étape 2: Générer l'embedding du prompt
+            try:
+                with self.metrics.time("embed", timings):
+                    prompt_embedding = await self.llm.agenerate_prompt_embedding(prompt)
+            except BaseException:
+                prefetch.cancel()
+                raise
 
-    def get_full_search_results(self, prompt: str):
-        """Centralise et retourne tous les résultats sous forme de dictionnaire"""
-        # Étape 1: Générer l'embedding du prompt
-        prompt_embedding = self.llm.generate_prompt_embedding(prompt)
+            # Résultat déjà servi pour une requête similaire
+            if self.semantic_cache is not None:
+                cached_hits = self.semantic_cache.get(prompt_embedding, context)
+                if cached_hits is not None:
+                    prefetch.cancel()
+                    self.metrics.record(timings)
+                    return cached_hits
 
-        # Étape 2: Recherche du chunk le plus similaire
-        similarity_results = self.search_similarity(prompt_embedding)
+            # Étape 3: Recherche des chunks les plus similaires
+            with self.metrics.time("search", timings):
+                dense_hits = await self.asearch_similarity(prompt_embedding, k if mode == "dense" else max(k, RRF_DEPTH), search_filter)
+            hits = dense_hits if mode == "dense" else self.fuse_results(dense_hits, lexical_hits, k)
 
-        # Etape 3: Récupère le texte du chunk le plus similaire
-        text_chunk = self.get_chunk_text(similarity_results)
+        # Étape 4: Récupère en parallèle les chunks et les vidéos non préchargées
+        prefetched = set(prefetched_ids)
+        with self.metrics.time("hydrate", timings):
+            chunk_rows, video_rows, other_video_rows = await asyncio.gather(
+                asyncio.to_thread(self.hydrator.fetch_chunks, [hit["chunk_id"] for hit in hits]),
+                prefetch,
+                asyncio.to_thread(self.hydrator.fetch_videos, [hit["vid_id"] for hit in hits if hit["vid_id"] not in prefetched]),
+            )
+            self.hydrator.apply(hits, chunk_rows, {**video_rows, **other_video_rows})
 
-        # Étape 4: Recherche du chapitre associé
-        chapter_results = self.search_similar_chapter(similarity_results)
+        # Étape 5: Retrouve le chapitre de chaque chunk et l'URL avec le timestamp
+        with self.metrics.time("chapters", timings):
+            self.resolve_chapters(hits)
 
-        # Étape 5: Récupérer l'URL de la vidéo avec le timestamp du chapitre
-        video_url = self.search_vid_url(similarity_results["vid_id"], chapter_results["chapter_id"])
+        if self.semantic_cache is not None and prompt_embedding is not None:
+            self.semantic_cache.put(prompt_embedding, context, hits)
 
-        # Retourner tous les résultats dans un seul dictionnaire
-        full_results = {
-            "chunk_id" : similarity_results["chunk_id"],
-            "chunk_text" : text_chunk,
-            "vid_id": similarity_results["vid_id"],
-            "chapter_id": chapter_results["chapter_id"],
-            "video_url_with_timestamp": video_url
-        }
+        self.metrics.record(timings)
+        return hits
 
-        return full_results
\ No newline at end of file
+    async def aget_full_search_results(self, prompt: str, mode: str = DEFAULT_SEARCH_MODE, search_filter: SearchFilter | None = None):
+        """Version asynchrone de `get_full_search_results`"""
+        hits = await self.asearch(prompt, k=1, mode=mode, search_filter=search_filter)
+        return hits[0] if hits else None
@@ -0,0 +1,152 @@
+"""
+Ce fichier contient le cache sémantique des résultats de recherche.
+"""
+
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+
+DEFAULT_THRESHOLD = 0.95  # Similarité cosinus minimale entre deux requêtes
+DEFAULT_TTL = 3600  # Durée de vie d'un résultat, en secondes
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class SemanticCache:
+    """
+    Cache des résultats de recherche adressé par similarité des embeddings de requêtes.
+
+    Une requête dont l'embedding est assez proche (similarité cosinus) de celui d'une
+    requête déjà servie dans le même contexte (mode, k, filtre) reçoit le même résultat,
+    sans recherche ni hydratation. Les embeddings normalisés sont stockés dans un petit
+    index FAISS à produit scalaire par contexte. Les entrées expirent après `ttl`
+    secondes et les moins récemment utilisées sont supprimées au-delà de `max_entries`.
+    """
+
+    def __init__(self, threshold: float | None = None, ttl: float | None = None, max_entries: int | None = None):
+        """
+        Initialise le cache sémantique.
+
+        Args:
+            threshold (float | None): Similarité cosinus minimale (SEMANTIC_CACHE_THRESHOLD par défaut).
+            ttl (float | None): Durée de vie des entrées en secondes (SEMANTIC_CACHE_TTL par défaut).
+            max_entries (int | None): Nombre maximal d'entrées (SEMANTIC_CACHE_MAX_ENTRIES par défaut).
+        """
+        if threshold is None:
+            threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD))
+        if ttl is None:
+            ttl = float(os.getenv("SEMANTIC_CACHE_TTL", DEFAULT_TTL))
+        if max_entries is None:
+            max_entries = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._indexes = {}
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _normalize(self, embedding: list[float]) -> np.ndarray:
+        """
+        Normalise un embedding pour que le produit scalaire soit la similarité cosinus.
+
+        Args:
+            embedding (list[float]): Embedding de la requête.
+
+        Returns:
+            np.ndarray: Embedding normalisé (une ligne).
+        """
+        vector = np.array([embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, entry_id: int):
+        """
+        Supprime une entrée (verrou déjà acquis).
+
+        Args:
+            entry_id (int): Identifiant de l'entrée.
+        """
+        context, _, _ = self._entries.pop(entry_id)
+        index = self._indexes[context]
+        index.remove_ids(np.array([entry_id], dtype=np.int64))
+        if index.ntotal == 0:
+            del self._indexes[context]
+
+    def get(self, embedding: list[float], context: tuple) -> list[dict] | None:
+        """
+        Retourne le résultat d'une requête similaire servie dans le même contexte.
+
+        Args:
+            embedding (list[float]): Embedding de la requête.
+            context (tuple): Contexte de la recherche (mode, k, filtre).
+
+        Returns:
+            list[dict] | None: Copie du résultat en cache, ou None.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            index = self._indexes.get(context)
+            if index is not None:
+                similarities, entry_ids = index.search(vector, 1)
+                entry_id = int(entry_ids[0][0])
+                if entry_id >= 0 and similarities[0][0] >= self.threshold:
+                    _, results, created_at = self._entries[entry_id]
+                    if time.monotonic() - created_at <= self.ttl:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        return copy.deepcopy(results)
+                    self._remove(entry_id)
+
+            self.misses += 1
+            return None
+
+    def put(self, embedding: list[float], context: tuple, results: list[dict]):
+        """
+        Ajoute le résultat d'une requête au cache.
+
+        Args:
+            embedding (list[float]): Embedding de la requête.
+            context (tuple): Contexte de la recherche (mode, k, filtre).
+            results (list[dict]): Résultat complet de la recherche.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            index = self._indexes.get(context)
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._indexes[context] = index
+
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (context, copy.deepcopy(results), time.monotonic())
+
+            # Suppression des entrées expirées, puis des moins récemment utilisées
+            now = time.monotonic()
+            for expired_id in [key for key, (_, _, created_at) in self._entries.items() if now - created_at > self.ttl]:
+                self._remove(expired_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """
+        Vide le cache (après un rechargement des index).
+        """
+        with self._lock:
+            self._indexes.clear()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Retourne les statistiques d'utilisation du cache.
+
+        Returns:
+            dict: Nombre de succès, d'échecs et d'entrées.
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}